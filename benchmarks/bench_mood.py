@@ -0,0 +1,91 @@
+"""
+CalmSpace - Mood Analytics Benchmark
+====================================
+Timings for mood insights over many sessions.
+
+Fills a session backend with generated check-ins (a few weeks per
+session, some with a declining trend), then times the cross-session
+report (mood_arrays() plus aggregate()) and the per-session insights
+shown by the mood command.
+
+Usage:
+    python benchmarks/bench_mood.py
+    python benchmarks/bench_mood.py --sessions 20000 --entries 60
+    python benchmarks/bench_mood.py --sqlite /tmp/moods.db
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from harness import REPO_ROOT
+
+sys.path.insert(0, REPO_ROOT)
+
+from mood_analytics import aggregate, analyze  # noqa: E402
+from session_store import MemorySessionBackend, SessionStore, SQLiteSessionBackend  # noqa: E402
+
+DAY_SECONDS = 86400
+
+
+def fill(backend, sessions: int, entries: int, seed: int):
+    """Log ``entries`` check-ins over the past few weeks for each session."""
+    rng = random.Random(seed)
+    now = time.time()
+    for index in range(sessions):
+        session_id = f"mood-{index}"
+        base = rng.uniform(2, 4.5)
+        slope = -2 / entries if rng.random() < 0.1 else 0.0
+        timestamp = now - entries * DAY_SECONDS / 2
+        for step in range(entries):
+            timestamp += rng.uniform(0.1, 1.0) * DAY_SECONDS
+            intensity = round(min(5, max(1, rng.gauss(base + slope * step, 0.8))))
+            backend.append_mood(session_id, {"mood": str(intensity), "intensity": intensity,
+                                             "timestamp": min(timestamp, now)})
+
+
+def best_of(repeat: int, call):
+    """Return the fastest of ``repeat`` runs of ``call()`` in seconds, and its result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = call()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CalmSpace mood analytics.")
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--entries", type=int, default=30, help="check-ins per session")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs; the fastest is reported")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--sqlite", help="use a SQLite backend at this (new) path instead of memory")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        if os.path.exists(args.sqlite):
+            parser.error(f"{args.sqlite} already exists")
+        backend = SQLiteSessionBackend(args.sqlite, ttl_seconds=7 * DAY_SECONDS)
+    else:
+        backend = MemorySessionBackend(SessionStore(max_entries=args.sessions, ttl_seconds=DAY_SECONDS))
+    fill(backend, args.sessions, args.entries, args.seed)
+
+    load_seconds, arrays = best_of(args.repeat, backend.mood_arrays)
+    aggregate_seconds, report = best_of(args.repeat, lambda: aggregate(*arrays))
+    logs = [backend.load(f"mood-{index}")["mood_history"] for index in range(min(1000, args.sessions))]
+    analyze_seconds, _ = best_of(args.repeat, lambda: [analyze(log) for log in logs])
+
+    print(f"{report['sessions']} sessions, {report['entries']} check-ins "
+          f"({'SQLite' if args.sqlite else 'memory'} backend)\n")
+    print(f"{'mood_arrays':<24} {load_seconds * 1000:>9.1f} ms")
+    print(f"{'aggregate':<24} {aggregate_seconds * 1000:>9.1f} ms")
+    print(f"{'cross-session total':<24} {(load_seconds + aggregate_seconds) * 1000:>9.1f} ms")
+    print(f"{'analyze (per session)':<24} {analyze_seconds / len(logs) * 1e6:>9.1f} µs")
+    print(f"\nDeclining sessions: {report['declining_sessions']} ({report['declining_share']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+CalmSpace - Routing Benchmark
+=============================
+Baseline timings for the per-message hot path, with the LLM stubbed out.
+
+Runs check_crisis, detect_scenario, get_resource, add_to_conversation and
+the full on_message handler over a generated corpus of student messages
+and reports messages/sec, per-call latency percentiles and tracemalloc
+allocations.
+
+Usage:
+    python benchmarks/bench_routing.py
+    python benchmarks/bench_routing.py --save baseline.json
+    python benchmarks/bench_routing.py --compare baseline.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from harness import StubLLM, current_session, generate_corpus, load_main
+
+# Sessions the corpus is spread over, so history and session lookups
+# behave like a busy worker rather than one very long conversation
+SESSIONS = 50
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(latencies_ns: List[int]) -> Dict[str, float]:
+    values = sorted(latencies_ns)
+    total_seconds = sum(values) / 1e9
+    return {
+        "calls": len(values),
+        "msgs_per_sec": len(values) / total_seconds if total_seconds else 0.0,
+        "mean_us": sum(values) / len(values) / 1e3,
+        "p50_us": percentile(values, 0.50) / 1e3,
+        "p95_us": percentile(values, 0.95) / 1e3,
+        "p99_us": percentile(values, 0.99) / 1e3,
+        "max_us": values[-1] / 1e3,
+    }
+
+
+async def measure(call: Callable, texts: List[str], repeat: int, is_async: bool) -> Dict[str, float]:
+    """Time every call, then repeat one pass under tracemalloc for allocations."""
+    latencies = []
+    for _ in range(repeat):
+        for index, text in enumerate(texts):
+            current_session.set(f"bench-{index % SESSIONS}")
+            started = time.perf_counter_ns()
+            if is_async:
+                await call(text)
+            else:
+                call(text)
+            latencies.append(time.perf_counter_ns() - started)
+    result = summarize(latencies)
+
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    peaks = []
+    for index, text in enumerate(texts):
+        current_session.set(f"bench-{index % SESSIONS}")
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        if is_async:
+            await call(text)
+        else:
+            call(text)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["alloc_peak_kib"] = sum(peaks) / len(peaks) / 1024
+    result["retained_kib"] = (retained - baseline) / 1024
+    return result
+
+
+async def run(args) -> Dict[str, dict]:
+    # Rate limits off, so free text keeps exercising the full AI path
+    main = load_main(SUMMARY_ENABLED="false", CHAT_RATE_PER_MINUTE="1e9", CHAT_BURST="1000000000")
+    stub = StubLLM()
+    for endpoint in main.llm_router.endpoints:
+        endpoint.client = stub
+    corpus = generate_corpus(main, size=args.messages, seed=args.seed)
+    texts = [text for _, text in corpus]
+    lowered = [text.lower() for text in texts]
+
+    class Incoming:
+        def __init__(self, content):
+            self.content = content
+
+    async def handle(text):
+        await main.on_message(Incoming(text))
+
+    # Warm lazily loaded content and indexes so the first calls aren't outliers
+    for text in texts[:50]:
+        await handle(text)
+
+    benchmarks = [
+        ("check_crisis", main.check_crisis, texts, False),
+        ("detect_scenario", main.detect_scenario, texts, False),
+        ("get_resource", main.get_resource, texts, False),
+        ("dispatch_command", main.dispatch_command, lowered, False),
+        ("add_to_conversation", lambda text: main.add_to_conversation("user", text), texts, False),
+        ("on_message", handle, texts, True),
+    ]
+    results = {}
+    for name, call, inputs, is_async in benchmarks:
+        results[name] = await measure(call, inputs, args.repeat, is_async)
+    results["on_message"]["llm_calls"] = stub.calls
+    return results
+
+
+def print_table(results: Dict[str, dict], corpus_size: int):
+    print(f"Corpus: {corpus_size} messages, {SESSIONS} sessions\n")
+    header = f"{'benchmark':<20} {'msgs/sec':>11} {'mean µs':>9} {'p50 µs':>9} {'p95 µs':>9} {'p99 µs':>9} {'max µs':>10} {'peak KiB':>9} {'kept KiB':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(f"{name:<20} {r['msgs_per_sec']:>11,.0f} {r['mean_us']:>9.1f} {r['p50_us']:>9.1f} "
+              f"{r['p95_us']:>9.1f} {r['p99_us']:>9.1f} {r['max_us']:>10.1f} "
+              f"{r['alloc_peak_kib']:>9.1f} {r['retained_kib']:>9.1f}")
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], max_regression: float) -> List[str]:
+    """Return a description of every benchmark that regressed past the threshold."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if r["p95_us"] > base["p95_us"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {base['p95_us']:.1f} -> {r['p95_us']:.1f} µs")
+        if r["msgs_per_sec"] < base["msgs_per_sec"] / (1 + max_regression):
+            regressions.append(f"{name}: {base['msgs_per_sec']:,.0f} -> {r['msgs_per_sec']:,.0f} msgs/sec")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CalmSpace message routing.")
+    parser.add_argument("--messages", type=int, default=2000, help="corpus size")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the corpus")
+    parser.add_argument("--seed", type=int, default=7, help="corpus random seed")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed slowdown before --compare fails (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_table(results, args.messages)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
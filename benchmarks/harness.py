@@ -0,0 +1,182 @@
+"""
+CalmSpace - Benchmark Harness
+=============================
+Shared setup for the scripts in benchmarks/.
+
+The scripts drive main.py's handlers directly, outside the Chainlit
+server. load_main() installs a minimal stand-in for the few Chainlit
+APIs the handlers use (messages, per-session storage and the event
+decorators) before importing main, so no browser or websocket is
+involved. StubLLM replaces the OpenAI client when only local work should
+be measured.
+"""
+
+import contextvars
+import os
+import random
+import sys
+import types
+from typing import List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The Chainlit session the current task is acting as
+current_session = contextvars.ContextVar("current_session", default="bench")
+
+
+class UserSession:
+    """Per-session key/value storage, keyed by ``current_session``."""
+
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key, default=None):
+        return self._data.get((current_session.get(), key), default)
+
+    def set(self, key, value):
+        self._data[(current_session.get(), key)] = value
+
+
+class Message:
+    """Chainlit message stand-in; counts what would be sent to the browser."""
+
+    sent = 0
+
+    def __init__(self, content: str = "", **kwargs):
+        self.content = content
+
+    async def send(self):
+        Message.sent += 1
+        return self
+
+    async def stream_token(self, token: str, is_sequence: bool = False):
+        self.content = token if is_sequence else self.content + token
+
+    async def update(self):
+        return self
+
+
+def _fake_chainlit() -> types.ModuleType:
+    module = types.ModuleType("chainlit")
+    module.Message = Message
+    module.user_session = UserSession()
+    module.on_chat_start = lambda func: func
+    module.on_message = lambda func: func
+    return module
+
+
+def load_main(**env):
+    """
+    Import main.py against the Chainlit stand-in and return the module.
+
+    Keyword arguments set environment variables first (e.g.
+    ``SUMMARY_ENABLED="false"``); the metrics endpoints and message event
+    log are off unless set explicitly.
+    """
+    defaults = {
+        "OPENAI_API_KEY": "sk-benchmark",
+        "METRICS_ENDPOINT_ENABLED": "false",
+        "EVENT_LOG_SAMPLE_RATE": "0",
+    }
+    for key, value in {**defaults, **env}.items():
+        if key in env or key not in os.environ:
+            os.environ[key] = str(value)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    sys.modules["chainlit"] = _fake_chainlit()
+    import main
+    return main
+
+
+# ============================================================================
+# STUB LLM
+# ============================================================================
+
+STUB_REPLY = ("That sounds really hard, and it makes sense that you feel this way. "
+              "Would it help to try a short breathing exercise together?")
+
+
+class StubLLM:
+    """In-process stand-in for AsyncOpenAI that replies instantly."""
+
+    def __init__(self, reply: str = STUB_REPLY):
+        self.reply = reply
+        self.calls = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    async def create(self, stream: bool = False, **kwargs):
+        self.calls += 1
+        if stream:
+            return StubStream(self._chunks())
+        message = types.SimpleNamespace(content=self.reply)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+    async def _chunks(self):
+        for word in self.reply.split(" "):
+            delta = types.SimpleNamespace(content=word + " ")
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+
+class StubStream:
+    """The part of the SDK's AsyncStream main.py uses: iteration and close()."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks
+
+    async def close(self):
+        self.closed = True
+        await self._chunks.aclose()
+
+
+# ============================================================================
+# MESSAGE CORPUS
+# ============================================================================
+
+OPENERS = ["", "honestly ", "idk, ", "hey, ", "so ", "ugh ", "I think ", "lately ", "tbh "]
+FEELINGS = ["I feel like", "I'm worried that", "I keep thinking", "it's like", "I just feel",
+            "I can't stop stressing because", "everyone says I'm fine but"]
+TAILS = ["", " and I don't know what to do", " and it's getting worse", " this week",
+         " since the semester started", " and I can't focus on anything", " lol", "..."]
+SMALL_TALK = ["hi", "hello", "thanks", "thank you so much", "ok", "that helped a bit",
+              "can we talk?", "I had a pretty normal day", "what should I do?", "yeah maybe"]
+
+# Share of each message kind in a generated corpus
+DEFAULT_MIX = {"command": 0.3, "resource": 0.1, "free_text": 0.57, "crisis": 0.03}
+
+
+def generate_corpus(main, size: int = 2000, seed: int = 7,
+                    mix: dict = DEFAULT_MIX) -> List[Tuple[str, str]]:
+    """
+    Generate ``size`` (kind, text) student messages from main's own tables.
+
+    Commands come from the routing table, resource requests from the
+    library, free text from scenario keywords in varied sentences, and
+    crisis messages embed a crisis phrase.
+    """
+    rng = random.Random(seed)
+    commands = list(main.COMMAND_TABLE) + [
+        f"challenge {rng.randint(1, 30)}" for _ in range(5)
+    ] + [f"coping {emotion}" for emotion in main.COPING_STRATEGIES] + [
+        "search sleep", "search panic attack", "search how to focus"]
+    resources = list(main.RESOURCE_LIBRARY) + [str(i) for i in range(1, len(main.RESOURCE_LIBRARY) + 1)]
+    keywords = [keyword for keywords in main.SCENARIO_KEYWORDS.values() for keyword in keywords]
+
+    def free_text():
+        if rng.random() < 0.2:
+            return rng.choice(SMALL_TALK)
+        picked = rng.sample(keywords, rng.choice((1, 1, 2, 3)))
+        return f"{rng.choice(OPENERS)}{rng.choice(FEELINGS)} {' and '.join(picked)}{rng.choice(TAILS)}"
+
+    generators = {
+        "command": lambda: rng.choice(commands),
+        "resource": lambda: rng.choice(resources),
+        "free_text": free_text,
+        "crisis": lambda: f"{rng.choice(OPENERS)}sometimes I think about {rng.choice(main.CRISIS_KEYWORDS)}",
+    }
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    return [(kind, generators[kind]()) for kind in rng.choices(kinds, weights, k=size)]
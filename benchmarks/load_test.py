@@ -0,0 +1,199 @@
+"""
+CalmSpace - Load Test
+=====================
+Simulate concurrent student sessions against one CalmSpace worker.
+
+Starts the mock LLM server (mock_llm_server.py) in a subprocess, points
+the real OpenAI client at it, and runs N concurrent sessions per level,
+each sending a mix of commands and free text to on_message with random
+think time in between. Every level reports throughput, latency
+percentiles, LLM requests and errors, messages answered locally because
+of rate limits or a full AI queue, and memory growth per session. Limits
+come from the usual environment variables (CHAT_RATE_PER_MINUTE, ...).
+
+Usage:
+    python benchmarks/load_test.py --sessions 10,50,200 --messages 20
+    python benchmarks/load_test.py --sessions 100 --error-rate 0.05 --no-stream
+    python benchmarks/load_test.py --server-url http://127.0.0.1:8787
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Tuple
+
+from harness import current_session, generate_corpus, load_main
+from mock_llm_server import add_server_arguments
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_llm_server.py")
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource  # peak rather than current outside Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def start_mock_server(args) -> Tuple[subprocess.Popen, str]:
+    """Launch the mock server on a free port and return (process, base URL)."""
+    command = [sys.executable, SERVER_SCRIPT, "--port", "0",
+               "--latency", str(args.latency), "--jitter", str(args.jitter),
+               "--ttft", str(args.ttft), "--token-delay", str(args.token_delay),
+               "--error-rate", str(args.error_rate), "--error-statuses", args.error_statuses]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line:
+        raise RuntimeError("Mock LLM server failed to start")
+    return process, line.rsplit(" ", 1)[-1].strip().removesuffix("/v1")
+
+
+def server_stats(base_url: str) -> dict:
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as response:
+        return json.load(response)
+
+
+class Incoming:
+    """The part of a Chainlit message on_message reads."""
+
+    def __init__(self, content: str):
+        self.content = content
+
+
+async def run_session(main, name: str, corpus: list, messages: int, think_time: float,
+                      rng: random.Random, latencies: Dict[str, list]):
+    """One simulated student: start a chat, then send messages with pauses."""
+    current_session.set(name)
+    await main.on_chat_start()
+    main.cl.user_session.set("id", name)  # on_chat_start's timestamp ID may collide across sessions
+    for _ in range(messages):
+        kind, text = rng.choice(corpus)
+        started = time.perf_counter()
+        await main.on_message(Incoming(text))
+        latencies.setdefault(kind, []).append(time.perf_counter() - started)
+        if think_time:
+            await asyncio.sleep(rng.expovariate(1 / think_time))
+
+
+async def run_level(main, sessions: int, corpus: list, args, base_url: str) -> dict:
+    """Run ``sessions`` concurrent sessions to completion and summarise them."""
+    rng = random.Random(args.corpus_seed + sessions)
+    latencies: Dict[str, list] = {}
+    llm_before = server_stats(base_url)
+    gc.collect()
+    memory_before = rss_bytes()
+    session_bytes_before = main.session_backend.stats().get("approx_bytes", 0)
+    limited_before = main.chat_rate_limiter.stats()["limited"]
+    busy_before = main.ai_admission.stats()["rejected"]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_session(main, f"load-{sessions}-{index}", corpus, args.messages, args.think_time,
+                    random.Random(rng.random()), latencies)
+        for index in range(sessions)
+    ))
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    llm_after = server_stats(base_url)
+    all_latencies = sorted(value for values in latencies.values() for value in values)
+    free_text = sorted(latencies.get("free_text", []))
+    return {
+        "sessions": sessions,
+        "messages": len(all_latencies),
+        "seconds": elapsed,
+        "msgs_per_sec": len(all_latencies) / elapsed,
+        "p50_ms": percentile(all_latencies, 0.50) * 1000,
+        "p95_ms": percentile(all_latencies, 0.95) * 1000,
+        "p99_ms": percentile(all_latencies, 0.99) * 1000,
+        "max_ms": all_latencies[-1] * 1000 if all_latencies else 0.0,
+        "free_text_p95_ms": percentile(free_text, 0.95) * 1000,
+        "llm_requests": llm_after["requests"] - llm_before["requests"],
+        "llm_errors": llm_after["errors"] - llm_before["errors"],
+        "llm_max_in_flight": llm_after["max_in_flight"],
+        "rate_limited": main.chat_rate_limiter.stats()["limited"] - limited_before,
+        "busy": main.ai_admission.stats()["rejected"] - busy_before,
+        "rss_per_session_kib": (rss_bytes() - memory_before) / sessions / 1024,
+        "session_store_per_session_kib":
+            (main.session_backend.stats().get("approx_bytes", 0) - session_bytes_before) / sessions / 1024,
+    }
+
+
+def print_header():
+    header = (f"{'sessions':>8} {'msgs':>6} {'msgs/sec':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'max ms':>8} {'chat p95':>9} {'LLM req':>8} {'LLM err':>8} {'limited':>8} {'busy':>6} {'RSS KiB/s':>10} {'store KiB/s':>11}")
+    print(header)
+    print("-" * len(header))
+
+
+def print_row(r: dict):
+    print(f"{r['sessions']:>8} {r['messages']:>6} {r['msgs_per_sec']:>9.1f} {r['p50_ms']:>8.1f} "
+          f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['free_text_p95_ms']:>9.1f} "
+          f"{r['llm_requests']:>8} {r['llm_errors']:>8} {r['rate_limited']:>8} {r['busy']:>6} {r['rss_per_session_kib']:>10.1f} "
+          f"{r['session_store_per_session_kib']:>11.1f}", flush=True)
+
+
+async def run(args, base_url: str) -> List[dict]:
+    main = load_main(OPENAI_BASE_URL=f"{base_url}/v1",
+                     STREAM_RESPONSES="true" if args.stream else "false")
+    corpus = generate_corpus(main, size=2000, seed=args.corpus_seed)
+    results = []
+    print_header()
+    for sessions in args.sessions:
+        results.append(await run_level(main, sessions, corpus, args, base_url))
+        print_row(results[-1])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test CalmSpace against a mock LLM server.")
+    parser.add_argument("--sessions", default="10,50,100",
+                        type=lambda value: [int(n) for n in value.split(",")],
+                        help="comma-separated concurrent session counts, run in order")
+    parser.add_argument("--messages", type=int, default=20, help="messages sent per session")
+    parser.add_argument("--think-time", type=float, default=1.0,
+                        help="mean seconds a student pauses between messages (0 for none)")
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True,
+                        help="stream AI replies (STREAM_RESPONSES)")
+    parser.add_argument("--corpus-seed", type=int, default=7)
+    parser.add_argument("--server-url", help="use an already running mock server instead of starting one")
+    parser.add_argument("--json", help="write results to this JSON file")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    process = None
+    base_url = args.server_url
+    if base_url is None:
+        process, base_url = start_mock_server(args)
+    try:
+        results = asyncio.run(run(args, base_url.rstrip("/")))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+CalmSpace - Mock LLM Server
+===========================
+Local OpenAI-compatible chat completions server for load testing.
+
+Serves POST /v1/chat/completions (plain JSON, or SSE when ``stream`` is
+set) with configurable latency, time-to-first-token, per-token delay and
+injected HTTP errors, so a worker can be load tested without calling
+OpenAI. GET /stats returns request and error counters.
+
+Only the standard library is used. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Usage:
+    python benchmarks/mock_llm_server.py --port 8787 --latency 0.8 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Optional, Tuple
+
+REPLY = ("I hear you, and that sounds like a lot to carry right now. It makes sense "
+         "that you're feeling this way. Would it help to talk through what feels most "
+         "pressing, or to try a quick grounding exercise together first?")
+
+ERROR_TYPES = {
+    429: "rate_limit_error",
+    500: "server_error",
+    502: "server_error",
+    503: "server_error",
+}
+
+STATUS_TEXT = {200: "OK", 404: "Not Found", 429: "Too Many Requests",
+               500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+class MockLLMServer:
+    """Minimal HTTP/1.1 server speaking the chat completions API."""
+
+    def __init__(self, latency: float = 0.8, jitter: float = 0.2, ttft: float = 0.3,
+                 token_delay: float = 0.02, error_rate: float = 0.0,
+                 error_statuses: Tuple[int, ...] = (429, 500), seed: Optional[int] = None):
+        """
+        ``latency``: seconds before a non-streamed reply, plus up to
+        ``jitter`` more. ``ttft`` and ``token_delay`` shape streamed
+        replies. ``error_rate``: fraction of completions answered with one
+        of ``error_statuses`` instead.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self._rng = random.Random(seed)
+        self._server = None
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start listening and return the bound port."""
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                await self._route(method, path, body, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None  # client closed the connection
+        lines = head.decode("latin-1").split("\r\n")
+        method, path, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0"))
+        body = await reader.readexactly(length) if length else b""
+        return method, path.split("?", 1)[0], body
+
+    @staticmethod
+    def _head(status: int, headers: dict) -> bytes:
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Error')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(self._head(status, {"Content-Type": "application/json",
+                                         "Content-Length": len(body)}) + body)
+        await writer.drain()
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        if method == "GET" and path == "/stats":
+            await self._send_json(writer, 200, self.stats)
+        elif method == "POST" and path.endswith("/chat/completions"):
+            await self._completion(json.loads(body or b"{}"), writer)
+        else:
+            await self._send_json(writer, 404, {"error": {"message": f"No route {method} {path}"}})
+
+    async def _completion(self, request: dict, writer: asyncio.StreamWriter):
+        stats = self.stats
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            if self._rng.random() < self.error_rate:
+                stats["errors"] += 1
+                status = self._rng.choice(self.error_statuses)
+                await asyncio.sleep(self.ttft)
+                await self._send_json(writer, status, {"error": {
+                    "message": "Injected error from the mock server",
+                    "type": ERROR_TYPES.get(status, "server_error"), "code": None}})
+                return
+
+            model = request.get("model", "mock")
+            reply = REPLY
+            prompt_tokens = len(json.dumps(request.get("messages", []))) // 4
+            if request.get("stream"):
+                stats["streamed"] += 1
+                await self._stream(writer, model, reply)
+                return
+
+            await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+            completion_tokens = len(reply) // 4
+            await self._send_json(writer, 200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+        finally:
+            stats["in_flight"] -= 1
+
+    async def _stream(self, writer: asyncio.StreamWriter, model: str, reply: str):
+        """Send the reply as server-sent events over a chunked response."""
+        writer.write(self._head(200, {"Content-Type": "text/event-stream",
+                                      "Transfer-Encoding": "chunked"}))
+
+        async def event(data: str):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            writer.write(f"{len(payload):x}\r\n".encode("latin-1") + payload + b"\r\n")
+            await writer.drain()
+
+        def chunk(delta: dict, finish_reason=None) -> str:
+            return json.dumps({
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            })
+
+        await asyncio.sleep(self.ttft + self._rng.uniform(0, self.jitter))
+        await event(chunk({"role": "assistant", "content": ""}))
+        for word in reply.split(" "):
+            await event(chunk({"content": word + " "}))
+            await asyncio.sleep(self.token_delay)
+        await event(chunk({}, "stop"))
+        await event("[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+async def serve(args):
+    server = MockLLMServer(
+        latency=args.latency, jitter=args.jitter, ttft=args.ttft, token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        error_statuses=tuple(int(status) for status in args.error_statuses.split(",")),
+        seed=args.seed
+    )
+    port = await server.start(args.host, args.port)
+    print(f"Mock LLM server listening on http://{args.host}:{port}/v1", flush=True)
+    await server.serve_forever()
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """Add the latency and error injection options shared with load_test.py."""
+    parser.add_argument("--latency", type=float, default=0.8, help="seconds before a non-streamed reply")
+    parser.add_argument("--jitter", type=float, default=0.2, help="extra random latency, up to this many seconds")
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first streamed token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of completions that fail")
+    parser.add_argument("--error-statuses", default="429,500", help="HTTP statuses used for injected errors")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for latency and errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock server for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787, help="0 picks a free port")
+    add_server_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+CalmSpace - Content Loader
+==========================
+Lazily loaded, hot-reloadable content catalog.
+
+The content library lives in ``content/`` as JSON instead of Python
+literals. Keyed collections (resources, exercises, meditations, coping
+strategies) are a directory with a ``manifest.json`` listing the keys in
+order, a short label for menus and one file per item; an item's file is
+read the first time that item is requested. Small list collections
+(challenges, affirmations) are a single file read on first access.
+
+``refresh()`` checks file modification times and drops anything that
+changed on disk, so edited content is picked up without a restart.
+"""
+
+import json
+import os
+from collections.abc import Mapping, Sequence
+from typing import Dict, Optional, Tuple
+
+CONTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content")
+
+
+def _read_json(path: str):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+class LazyCatalog(Mapping):
+    """Read-only mapping of content items, each loaded on first request."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._manifest_path = os.path.join(directory, "manifest.json")
+        self._manifest: Optional[Dict[str, dict]] = None
+        self._manifest_mtime = 0.0
+        self._items: Dict[str, Tuple[float, dict]] = {}  # key -> (mtime, item)
+        self._read_mtimes: Dict[str, float] = {}  # key -> mtime, for items read() but not kept
+
+    def _entries(self) -> Dict[str, dict]:
+        if self._manifest is None:
+            self._manifest_mtime = _mtime(self._manifest_path)
+            manifest = _read_json(self._manifest_path)
+            self._manifest = {entry["key"]: entry for entry in manifest["items"]}
+        return self._manifest
+
+    def _item_path(self, key: str) -> str:
+        return os.path.join(self.directory, self._entries()[key]["file"])
+
+    def __getitem__(self, key: str) -> dict:
+        cached = self._items.get(key)
+        if cached is not None:
+            return cached[1]
+        path = self._item_path(key)
+        item = _read_json(path)
+        self._items[key] = (_mtime(path), item)
+        return item
+
+    def read(self, key: str) -> dict:
+        """
+        Return an item, reading it from disk without keeping it loaded if it
+        is not already. Its modification time is still recorded, so
+        ``refresh()`` reports the change when the file is edited.
+        """
+        cached = self._items.get(key)
+        if cached is not None:
+            return cached[1]
+        path = self._item_path(key)
+        self._read_mtimes[key] = _mtime(path)
+        return _read_json(path)
+
+    def __iter__(self):
+        return iter(self._entries())
+
+    def __len__(self) -> int:
+        return len(self._entries())
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries()
+
+    def label(self, key: str) -> str:
+        """Return an item's menu label from the manifest, without loading the item."""
+        return self._entries()[key]["label"]
+
+    def loaded(self) -> int:
+        """Return how many items are currently loaded."""
+        return len(self._items)
+
+    def refresh(self) -> bool:
+        """
+        Drop the manifest or items whose files changed on disk; return True
+        if the manifest or any item that was loaded or read() did.
+        """
+        if self._manifest is None:
+            return False
+        if _mtime(self._manifest_path) != self._manifest_mtime:
+            self._manifest = None
+            self._items.clear()
+            self._read_mtimes.clear()
+            return True
+        stale = [key for key, (mtime, _) in self._items.items()
+                 if key not in self._manifest or _mtime(self._item_path(key)) != mtime]
+        for key in stale:
+            del self._items[key]
+        changed = [key for key, mtime in self._read_mtimes.items()
+                   if key not in self._manifest or _mtime(self._item_path(key)) != mtime]
+        for key in changed:
+            del self._read_mtimes[key]
+        return bool(stale or changed)
+
+
+class LazyList(Sequence):
+    """Read-only list collection loaded from one file on first access."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data: Optional[list] = None
+        self._mtime = 0.0
+
+    def _load(self) -> list:
+        if self._data is None:
+            self._mtime = _mtime(self.path)
+            self._data = _read_json(self.path)
+        return self._data
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def refresh(self) -> bool:
+        """Drop the data if its file changed on disk; return True if it did."""
+        if self._data is not None and _mtime(self.path) != self._mtime:
+            self._data = None
+            return True
+        return False
+
+
+def catalog(name: str, content_dir: str = CONTENT_DIR) -> LazyCatalog:
+    """Return the keyed collection stored in ``content/<name>/``."""
+    return LazyCatalog(os.path.join(content_dir, name))
+
+
+def collection(name: str, content_dir: str = CONTENT_DIR) -> LazyList:
+    """Return the list collection stored in ``content/<name>.json``."""
+    return LazyList(os.path.join(content_dir, f"{name}.json"))
@@ -0,0 +1,102 @@
+"""
+CalmSpace - Context Builder
+===========================
+Token-budgeted prompt assembly for AI responses.
+
+System prompts and the current message are always sent. Recent turns are
+added newest first until the budget is spent. Apart from the latest
+exchange, turns longer than the per-turn cap (for example stored crisis
+replies with the full helpline block) are collapsed to a short excerpt
+before they are counted. Turns older than the window are represented by
+the session's rolling summary instead.
+"""
+
+from itertools import islice
+from typing import Iterable, NamedTuple, Reversible
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional; fall back to an estimate
+    _ENCODING = None
+
+# Per-message framing tokens added by the chat format, plus reply priming
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_PRIMING_TOKENS = 3
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens exactly with tiktoken, or estimate ~4 characters per token."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens, marking that it was shortened."""
+    if _ENCODING is not None:
+        tokens = _ENCODING.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return _ENCODING.decode(tokens[:max_tokens]).rstrip() + " …"
+    if len(text) <= max_tokens * 4:
+        return text
+    return text[:max_tokens * 4].rstrip() + " …"
+
+
+class ContextStats(NamedTuple):
+    """Size report for one built prompt."""
+    prompt_tokens: int
+    turns_included: int
+    turns_collapsed: int
+    turns_dropped: int
+
+
+def build_context(system_prompts: Iterable[str], history: Reversible, user_message: str,
+                  budget: int, max_turns: int = 10, turn_max_tokens: int = 150,
+                  keep_recent: int = 2, summary: str = "", skip_latest: int = 0):
+    """
+    Build chat messages that fit within ``budget`` prompt tokens.
+
+    Returns (messages, stats). ``history`` holds turns with ``role`` and
+    ``content`` attributes, oldest first. It is walked newest first without
+    copying: the latest ``skip_latest`` turns are skipped, only the next
+    ``max_turns`` are considered, and the newest ``keep_recent`` of those
+    are never collapsed. A non-empty ``summary`` of earlier turns is
+    sent as an extra system message.
+    """
+    messages = [{"role": "system", "content": prompt} for prompt in system_prompts]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+    current = {"role": "user", "content": user_message}
+
+    used = REPLY_PRIMING_TOKENS + sum(
+        count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages + [current])
+
+    included = []
+    collapsed = 0
+    recent = islice(reversed(history), skip_latest, skip_latest + max(max_turns, 0))
+    for age, turn in enumerate(recent):
+        content = turn.content
+        tokens = count_tokens(content)
+        is_collapsed = age >= keep_recent and tokens > turn_max_tokens
+        if is_collapsed:
+            content = truncate_to_tokens(content, turn_max_tokens)
+            tokens = count_tokens(content)
+        if used + tokens + MESSAGE_OVERHEAD_TOKENS > budget:
+            break
+        used += tokens + MESSAGE_OVERHEAD_TOKENS
+        collapsed += is_collapsed
+        included.append({"role": turn.role, "content": content})
+
+    included.reverse()
+    messages.extend(included)
+    messages.append(current)
+
+    stats = ContextStats(
+        prompt_tokens=used,
+        turns_included=len(included),
+        turns_collapsed=collapsed,
+        turns_dropped=max(len(history) - skip_latest, 0) - len(included)
+    )
+    return messages, stats
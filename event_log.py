@@ -0,0 +1,107 @@
+"""
+CalmSpace - Event Log
+=====================
+Structured, non-blocking JSON event log.
+
+Callers only put a log record on an in-memory queue; a QueueListener
+thread formats it as one JSON line and writes it, so logging never
+blocks the event loop on I/O. Routine message events can be sampled;
+error events are always kept.
+
+Conversations are mental-health data, so redaction is on by default:
+free-text fields are replaced by their length and session IDs are only
+ever written as salted hashes.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import queue
+import random
+import secrets
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Optional
+
+# Fields that may contain user or model text
+TEXT_FIELDS = frozenset({"message", "response", "error_message"})
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record and its ``fields`` as a single JSON line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+        }
+        event.update(getattr(record, "fields", {}))
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class EventLog:
+    """JSON event logger with queue handoff, sampling and redaction."""
+
+    def __init__(self, name: str = "calmspace.events", path: str = "",
+                 sample_rate: float = 1.0, redact: bool = True,
+                 salt: Optional[str] = None, rng: Callable[[], float] = random.random):
+        """
+        Start the background writer.
+
+        ``path``: file to append events to; empty writes to stderr.
+        ``sample_rate``: fraction of message events kept.
+        ``salt``: secret for session hashes; a random one per process if
+        not given, so hashes cannot be reversed by guessing IDs.
+        """
+        self.sample_rate = sample_rate
+        self.redact = redact
+        self._salt = (salt or secrets.token_hex(16)).encode("utf-8")
+        self._rng = rng
+
+        handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter())
+        self._queue = queue.SimpleQueue()
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+        self._running = True
+        atexit.register(self.close)
+
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.handlers = [QueueHandler(self._queue)]
+
+    def session_hash(self, session_id: str) -> str:
+        """Return a short salted hash identifying a session in the log."""
+        return hashlib.sha256(self._salt + session_id.encode("utf-8")).hexdigest()[:16]
+
+    def _redacted(self, fields: dict) -> dict:
+        if not self.redact:
+            return fields
+        return {
+            key: f"[redacted {len(value)} chars]" if key in TEXT_FIELDS and isinstance(value, str) else value
+            for key, value in fields.items()
+        }
+
+    def emit(self, event: str, level: int = logging.INFO, **fields):
+        """Queue one event; formatting and writing happen on the listener thread."""
+        self.logger.log(level, event, extra={"fields": self._redacted(fields)})
+
+    def message(self, **fields):
+        """Log a handled message, subject to sampling unless it carries an error."""
+        if "error" not in fields and self._rng() >= self.sample_rate:
+            return
+        self.emit("message", logging.WARNING if "error" in fields else logging.INFO, **fields)
+
+    def error(self, event: str, exc: BaseException, **fields):
+        """Log a failure with its exception class; never sampled."""
+        self.emit(event, logging.ERROR, error=type(exc).__name__, error_message=str(exc), **fields)
+
+    def close(self):
+        """Flush queued events and stop the writer thread."""
+        if self._running:
+            self._running = False
+            self._listener.stop()
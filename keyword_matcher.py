@@ -0,0 +1,140 @@
+"""
+CalmSpace - Keyword Matcher
+===========================
+Single-pass multi-keyword matching (Aho-Corasick).
+
+All keywords are compiled once into a trie with failure links, so finding
+every keyword in a message costs one pass over the message regardless of
+how many keywords are registered. Scenario classification works on word
+tokens instead, so 'test' no longer matches inside 'latest'.
+"""
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+
+class KeywordMatch(NamedTuple):
+    """A keyword found in a message."""
+    keyword: str
+    label: str
+    start: int
+    end: int
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over labelled keywords."""
+
+    def __init__(self, keywords: Dict[str, Iterable[str]]):
+        """Build the automaton from a mapping of label -> keywords."""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[tuple]] = [[]]
+
+        for label, words in keywords.items():
+            for word in words:
+                self._add(word.lower(), label)
+        self._link()
+
+    def _add(self, keyword: str, label: str):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((keyword, label))
+
+    def _link(self):
+        """Compute failure links breadth-first and merge suffix outputs."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """Return every keyword occurrence in ``text``, with positions in the lower-cased text."""
+        goto, fail, output = self._goto, self._fail, self._output
+        matches = []
+        state = 0
+        for index, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword, label in output[state]:
+                matches.append(KeywordMatch(keyword, label, index - len(keyword) + 1, index + 1))
+        return matches
+
+    def labels(self, text: str) -> set:
+        """Return the set of labels with at least one keyword in ``text``."""
+        return {match.label for match in self.find_all(text)}
+
+
+# ============================================================================
+# SCORED SCENARIO CLASSIFICATION
+# ============================================================================
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def stem(token: str) -> str:
+    """Strip common English suffixes so 'exams' matches 'exam'."""
+    for suffix in ("ing", "ed", "s"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3 and not token.endswith("ss"):
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower-cased, stemmed word tokens."""
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower().replace("’", "'"))]
+
+
+class ScenarioClassifier:
+    """
+    Word-boundary keyword classifier that ranks every matching scenario.
+
+    Keywords are tokenized once into phrases indexed by their first token,
+    so classifying a message is one pass over its tokens with a hash lookup
+    per token. A phrase scores its token count divided by the number of
+    scenarios it belongs to, so long specific phrases outweigh single words
+    and shared words ('exhausted') split their weight.
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]]):
+        owners: Dict[tuple, List[str]] = {}
+        for label, words in keywords.items():
+            for word in words:
+                phrase = tuple(tokenize(word))
+                if phrase and label not in owners.setdefault(phrase, []):
+                    owners[phrase].append(label)
+
+        self._order = {label: index for index, label in enumerate(keywords)}
+        self._phrases: Dict[str, List[tuple]] = {}
+        for phrase, labels in owners.items():
+            weight = len(phrase) / len(labels)
+            self._phrases.setdefault(phrase[0], []).append((phrase, tuple(labels), weight))
+
+    def classify(self, text: str) -> List[Tuple[str, float]]:
+        """Return (label, confidence) pairs ranked by score, best first."""
+        tokens = tokenize(text)
+        scores: Dict[str, float] = {}
+        for index, token in enumerate(tokens):
+            for phrase, labels, weight in self._phrases.get(token, ()):
+                if len(phrase) == 1 or tuple(tokens[index:index + len(phrase)]) == phrase:
+                    for label in labels:
+                        scores[label] = scores.get(label, 0.0) + weight
+
+        total = sum(scores.values())
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self._order[item[0]]))
+        return [(label, score / total) for label, score in ranked]
@@ -0,0 +1,271 @@
+"""
+CalmSpace - LLM Router
+======================
+Fallback chain of OpenAI-compatible model endpoints.
+
+Endpoints are tried in configured order (e.g. a hosted model first, then
+a local stand-in), skipping any that live statistics show to be
+unhealthy: an open circuit breaker, a high recent error rate, or a p95
+latency above the endpoint's limit. Every attempt has its own timeout,
+and an endpoint that fails or times out is followed straight away by the
+next one. When a request is still waiting after the endpoint's own recent
+p95, a hedged copy is sent to the next healthy endpoint and whichever
+answers first wins, which keeps tail latency bounded when one backend
+slows down.
+
+Latency is tracked separately per request kind (a full completion, the
+first chunk of a stream, a summary), so each p95 describes one kind of
+request.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from openai import AsyncOpenAI
+
+from resilience import CircuitBreaker, CircuitOpenError, is_retryable
+
+# Weight of the newest outcome in an endpoint's error rate
+ERROR_RATE_ALPHA = 0.1
+
+DEFAULT_ENDPOINTS = [
+    {"name": "openai", "model": "gpt-4o-mini", "temperature": 0.7, "max_tokens": 500},
+]
+
+
+class ModelEndpoint:
+    """One model behind an OpenAI-compatible API, with its live statistics."""
+
+    def __init__(self, name: str, model: str, client, temperature: float = 0.7,
+                 max_tokens: int = 500, max_error_rate: float = 0.5,
+                 max_p95_seconds: Optional[float] = None, window: int = 200,
+                 timeout: Optional[float] = None, breaker: Optional[CircuitBreaker] = None):
+        """
+        ``max_error_rate``/``max_p95_seconds``: above these the endpoint
+        is passed over while a healthier one is available. ``window``:
+        recent successful requests of each kind kept for latency
+        percentiles. ``timeout``: per-attempt limit, overriding the
+        router's.
+        """
+        self.name = name
+        self.model = model
+        self.client = client
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.max_error_rate = max_error_rate
+        self.max_p95_seconds = max_p95_seconds
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.window = window
+        self.latencies: Dict[str, deque] = {}  # request kind -> recent latencies
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def samples(self, kind: str) -> int:
+        return len(self.latencies.get(kind, ()))
+
+    def percentile(self, q: float, kind: str) -> Optional[float]:
+        """Return the q-quantile of recent latencies of a request kind, or None without data."""
+        values = sorted(self.latencies.get(kind, ()))
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def healthy(self, kind: str) -> bool:
+        if self.breaker.state == CircuitBreaker.OPEN or self.error_rate >= self.max_error_rate:
+            return False
+        p95 = self.percentile(0.95, kind)
+        return self.max_p95_seconds is None or p95 is None or p95 <= self.max_p95_seconds
+
+    def _add_latency(self, elapsed: float, kind: str):
+        window = self.latencies.get(kind)
+        if window is None:
+            window = self.latencies[kind] = deque(maxlen=self.window)
+        window.append(elapsed)
+
+    def record(self, elapsed: float, kind: str, error: Optional[BaseException] = None):
+        """Update latency, error rate and breaker after a finished request."""
+        self.requests += 1
+        failed = error is not None and is_retryable(error)
+        self.error_rate += ERROR_RATE_ALPHA * (float(failed) - self.error_rate)
+        if error is None:
+            self._add_latency(elapsed, kind)
+        else:
+            self.errors += 1
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def record_overtaken(self, elapsed: float, kind: str):
+        """Count the time waited before a hedge answered first as a (lower bound) latency."""
+        self._add_latency(elapsed, kind)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": self.error_rate,
+            "latency": {kind: {"samples": self.samples(kind), "p50": self.percentile(0.50, kind),
+                               "p95": self.percentile(0.95, kind)}
+                        for kind in self.latencies},
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "circuit_state": self.breaker.state,
+        }
+
+
+def endpoints_from_config(config: List[dict],
+                          breaker: Callable[[], CircuitBreaker] = CircuitBreaker) -> List[ModelEndpoint]:
+    """
+    Build endpoints from config entries with ``name``, ``model`` and
+    optional ``base_url``, ``api_key_env`` (default OPENAI_API_KEY),
+    ``temperature``, ``max_tokens``, ``max_error_rate``,
+    ``max_p95_seconds`` and ``timeout_seconds``.
+    """
+    endpoints = []
+    for entry in config:
+        api_key_env = entry.get("api_key_env", "OPENAI_API_KEY")
+        api_key = os.getenv(api_key_env) if api_key_env else None
+        if entry.get("base_url") and not api_key:
+            api_key = "unused"  # local servers usually ignore the key, but the SDK requires one
+        client = AsyncOpenAI(api_key=api_key, base_url=entry.get("base_url"), max_retries=0)
+        endpoints.append(ModelEndpoint(
+            name=entry.get("name", entry["model"]),
+            model=entry["model"],
+            client=client,
+            temperature=entry.get("temperature", 0.7),
+            max_tokens=entry.get("max_tokens", 500),
+            max_error_rate=entry.get("max_error_rate", 0.5),
+            max_p95_seconds=entry.get("max_p95_seconds"),
+            timeout=entry.get("timeout_seconds"),
+            breaker=breaker()
+        ))
+    return endpoints
+
+
+class LLMRouter:
+    """Route requests along the endpoint chain with failover and hedging."""
+
+    def __init__(self, endpoints: List[ModelEndpoint], hedge: bool = True,
+                 hedge_min_samples: int = 20, attempt_timeout: Optional[float] = None,
+                 clock: Callable[[], float] = time.perf_counter):
+        """
+        ``hedge_min_samples``: requests of a kind an endpoint needs before
+        its p95 is trusted for hedging. ``attempt_timeout``: longest one
+        endpoint may take before the next is tried, unless the endpoint
+        sets its own.
+        """
+        if not endpoints:
+            raise ValueError("LLMRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.attempt_timeout = attempt_timeout
+        self._clock = clock
+
+    def ranked(self, kind: str) -> List[ModelEndpoint]:
+        """Healthy endpoints in chain order, then the rest, least unhealthy first."""
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.healthy(kind)]
+        unhealthy = sorted(
+            (endpoint for endpoint in self.endpoints if endpoint not in healthy),
+            key=lambda endpoint: (endpoint.breaker.state == CircuitBreaker.OPEN,
+                                  endpoint.error_rate, endpoint.percentile(0.95, kind) or 0.0))
+        return healthy + unhealthy
+
+    def hedge_delay(self, endpoint: ModelEndpoint, kind: str) -> Optional[float]:
+        if not self.hedge or endpoint.samples(kind) < self.hedge_min_samples:
+            return None
+        return endpoint.percentile(0.95, kind)
+
+    async def _attempt(self, endpoint: ModelEndpoint, make_request, kind: str):
+        if not endpoint.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for LLM endpoint {endpoint.name}")
+        timeout = endpoint.timeout if endpoint.timeout is not None else self.attempt_timeout
+        started = self._clock()
+        try:
+            async with asyncio.timeout(timeout):
+                result = await make_request(endpoint)
+        except asyncio.CancelledError:
+            # A hedge that lost (or a caller that gave up) says nothing
+            # about the endpoint, but must not hold its half-open trial
+            endpoint.breaker.release()
+            raise
+        except Exception as e:
+            endpoint.record(self._clock() - started, kind, e)
+            raise
+        endpoint.record(self._clock() - started, kind)
+        return result
+
+    async def _hedged(self, primary: ModelEndpoint, backups: List[ModelEndpoint], make_request,
+                      kind: str, hedge: bool, discard):
+        started = self._clock()
+        first = asyncio.ensure_future(self._attempt(primary, make_request, kind))
+        delay = self.hedge_delay(primary, kind) if hedge else None
+        if delay is None:
+            return primary, await first
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except asyncio.CancelledError:
+            first.cancel()  # wait() leaves its tasks running when the caller is cancelled
+            raise
+        if done:
+            return primary, first.result()
+
+        target = next((endpoint for endpoint in backups if endpoint.healthy(kind)), primary)
+        target.hedges += 1
+        second = asyncio.ensure_future(self._attempt(target, make_request, kind))
+        owners = {first: primary, second: target}
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                if winners:
+                    for extra in winners[1:]:
+                        if discard is not None:
+                            await discard(extra.result())
+                    if winners[0] is second:
+                        target.hedge_wins += 1
+                        if target is not primary:
+                            primary.record_overtaken(self._clock() - started, kind)
+                    return owners[winners[0]], winners[0].result()
+                error = next(iter(done)).exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, make_request: Callable[[ModelEndpoint], Awaitable], kind: str = "chat",
+                   hedge: bool = True,
+                   discard: Optional[Callable[[object], Awaitable]] = None) -> Tuple[ModelEndpoint, object]:
+        """
+        Run ``make_request(endpoint)`` along the chain; return the endpoint
+        that answered and its result.
+
+        ``kind`` names the request type whose latency statistics are used
+        and updated. Each endpoint that fails or times out is followed by
+        the next; the last error is raised if all fail. ``discard``
+        releases the result of a hedge that finished but lost (e.g.
+        closes an open stream).
+        """
+        candidates = self.ranked(kind)
+        error: Optional[BaseException] = None
+        while candidates:
+            endpoint = candidates.pop(0)
+            try:
+                return await self._hedged(endpoint, candidates, make_request, kind, hedge, discard)
+            except Exception as e:
+                error = e
+        raise error
+
+    def stats(self) -> List[dict]:
+        return [endpoint.stats() for endpoint in self.endpoints]
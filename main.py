@@ -13,14 +13,160 @@ Features:
 """
 
 import chainlit as cl
-from openai import OpenAI
+import asyncio
+import functools
+import json
 import os
+import time
+from contextvars import ContextVar
+from itertools import islice
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Dict, Optional
 import random
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import numpy as np
+
+from content_loader import catalog, collection
+from context_builder import build_context, count_tokens
+from event_log import EventLog
+from keyword_matcher import KeywordMatcher, ScenarioClassifier
+from llm_router import DEFAULT_ENDPOINTS, LLMRouter, endpoints_from_config
+from metrics import MetricsRegistry
+from mood_analytics import TIMES_OF_DAY, WEEKDAYS, aggregate as aggregate_moods, analyze as analyze_moods
+from rate_limiter import AdmissionController, AdmissionRejected, SessionRateLimiter
+from resilience import CircuitBreaker, ResilientCaller
+from response_cache import ResponseCache, prompt_key
+from retrieval import PassageRetriever
+from search_index import BM25Index, ResourceIndex
+from session_store import (
+    ConversationTurn, MemorySessionBackend, SessionStore, SQLiteSessionBackend
+)
+from single_flight import FlightAbandoned, SingleFlight
+
+# Maximum number of completions in flight at once for this worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Admission control for AI chat: each session may send CHAT_BURST messages
+# to the AI at once, refilled at CHAT_RATE_PER_MINUTE; at most
+# AI_MAX_IN_FLIGHT replies are generated together and others queue for up
+# to AI_QUEUE_MAX_WAIT_SECONDS. Turned-away messages get a local reply
+chat_rate_limiter = SessionRateLimiter(
+    rate_per_minute=float(os.getenv("CHAT_RATE_PER_MINUTE", "6")),
+    burst=int(os.getenv("CHAT_BURST", "5"))
+)
+ai_admission = AdmissionController(
+    max_in_flight=int(os.getenv("AI_MAX_IN_FLIGHT", str(LLM_MAX_CONCURRENCY))),
+    max_queue=int(os.getenv("AI_QUEUE_MAX_LENGTH", "100")),
+    max_wait_seconds=float(os.getenv("AI_QUEUE_MAX_WAIT_SECONDS", "5"))
+)
+
+# Circuit breakers: after CIRCUIT_FAILURE_THRESHOLD failed attempts in a
+# row, calls fail fast for CIRCUIT_RESET_SECONDS
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+
+def new_circuit_breaker() -> CircuitBreaker:
+    return CircuitBreaker(failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS)
+
+
+# Chain of OpenAI-compatible endpoints (async clients, so completions never
+# block the event loop), tried in order while healthy; an endpoint slower
+# than LLM_ATTEMPT_TIMEOUT_SECONDS is abandoned for the next, and a
+# request still waiting after its endpoint's p95 is hedged to the next one
+LLM_ENDPOINTS = json.loads(os.getenv("LLM_ENDPOINTS") or "null") or DEFAULT_ENDPOINTS
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+llm_router = LLMRouter(
+    endpoints_from_config(LLM_ENDPOINTS, breaker=new_circuit_breaker),
+    hedge=LLM_HEDGE_ENABLED,
+    hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+    attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "10"))
+)
+
+# Each AI call gets LLM_DEADLINE_SECONDS in total across the chain, with
+# transient errors retried inside it; the breaker here opens when the
+# whole chain keeps failing, so replies fall back to local content
+llm_caller = ResilientCaller(
+    deadline_seconds=float(os.getenv("LLM_DEADLINE_SECONDS", "20")),
+    attempt_timeout=None,  # each endpoint attempt is timed by llm_router
+    max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+    breaker=new_circuit_breaker()
+)
+
+# Stream AI replies token-by-token into the Chainlit message
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+# Prompt size limits: total prompt tokens per request, history turns
+# considered, and the size above which an old turn is collapsed
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "10"))
+HISTORY_TURN_MAX_TOKENS = int(os.getenv("HISTORY_TURN_MAX_TOKENS", "150"))
+
+# Rolling summaries: turns that fall out of the history window are folded
+# into a per-session summary in the background, SUMMARY_BATCH_TURNS at a time
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+SUMMARY_BATCH_TURNS = int(os.getenv("SUMMARY_BATCH_TURNS", "4"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "200"))
+
+# Local retrieval: library passages scoring at least RETRIEVAL_MIN_SCORE are
+# added to the AI context; at RETRIEVAL_DIRECT_SCORE the best passage is
+# sent directly without calling the AI
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "true").lower() in ("1", "true", "yes")
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "2"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.25"))
+RETRIEVAL_DIRECT_SCORE = float(os.getenv("RETRIEVAL_DIRECT_SCORE", "0.75"))
+RETRIEVAL_PASSAGE_CHARS = 500
+
+# Opt-in cache for replies to prompts with at most RESPONSE_CACHE_MAX_HISTORY
+# earlier turns; crisis messages are never cached
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_HISTORY = int(os.getenv("RESPONSE_CACHE_MAX_HISTORY", "0"))
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+) if RESPONSE_CACHE_ENABLED else None
+
+# Identical concurrent prompts with no history (e.g. a class opening with
+# the same message) share one upstream call; crisis messages never do
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() in ("1", "true", "yes")
+single_flight = SingleFlight()
+
+# Mood insights: the average of the last MOOD_TREND_WINDOW check-ins is
+# compared with the window before it, and a drop of MOOD_DECLINE_DROP or
+# MOOD_LOW_STREAK_ALERT low check-ins in a row triggers a gentle alert
+MOOD_TREND_WINDOW = int(os.getenv("MOOD_TREND_WINDOW", "3"))
+MOOD_DECLINE_DROP = float(os.getenv("MOOD_DECLINE_DROP", "1.0"))
+MOOD_LOW_STREAK_ALERT = int(os.getenv("MOOD_LOW_STREAK_ALERT", "3"))
+MOOD_PATTERN_MIN_ENTRIES = 7  # check-ins before weekday/time-of-day patterns are shown
+MOOD_REPORT_MAX_AGE = 60  # seconds a cross-session mood report is served before recomputing
+
+# The cross-session mood report describes how students feel, so it is off
+# by default and has its own endpoint, separate from the metrics; it is
+# withheld until at least MOOD_REPORT_MIN_SESSIONS sessions have moods
+MOOD_REPORT_ENDPOINT_ENABLED = os.getenv("MOOD_REPORT_ENDPOINT_ENABLED", "false").lower() in ("1", "true", "yes")
+MOOD_REPORT_MIN_SESSIONS = int(os.getenv("MOOD_REPORT_MIN_SESSIONS", "20"))
+
+# Latency histograms per route and per pipeline stage, served at /metrics
+# (Prometheus text) and /metrics.json
+METRICS_ENDPOINT_ENABLED = os.getenv("METRICS_ENDPOINT_ENABLED", "true").lower() in ("1", "true", "yes")
+metrics = MetricsRegistry()
+metrics.describe("message_seconds", "Time to handle one chat message, by route.")
+metrics.describe("stage_seconds", "Time spent in each message pipeline stage.")
+metrics.describe("llm_first_token_seconds", "Time from request to first AI token.")
+metrics.describe("prompt_tokens", "Prompt size of AI requests in tokens.",
+                 buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 8000))
+
+# One JSON event per handled message; free text is redacted unless
+# EVENT_LOG_REDACT is turned off, and sessions appear only as salted hashes
+event_log = EventLog(
+    path=os.getenv("EVENT_LOG_PATH", ""),
+    sample_rate=float(os.getenv("EVENT_LOG_SAMPLE_RATE", "1.0")),
+    redact=os.getenv("EVENT_LOG_REDACT", "true").lower() in ("1", "true", "yes"),
+    salt=os.getenv("EVENT_LOG_SALT") or None
+)
+
+FALLBACK_RESPONSE = "I'm having trouble connecting right now. Please try again in a moment. If you're in crisis, please type 'crisis' for helpline numbers. 💙"
 
 # ============================================================================
 # SYSTEM PROMPTS FOR DIFFERENT SCENARIOS
@@ -125,672 +271,26 @@ SCENARIO_PROMPTS = {
 }
 
 # ============================================================================
-# RESOURCE LIBRARY - 20+ Mental Health Topics
+# CONTENT CATALOG
 # ============================================================================
-
-RESOURCE_LIBRARY = {
-    "stress management": {
-        "title": "📚 Stress Management",
-        "content": """**Understanding & Managing Stress**
-
-Stress is your body's response to demands. Some stress is normal, but chronic stress affects your health.
-
-**Signs of Stress:**
-• Racing thoughts or difficulty concentrating
-• Muscle tension, headaches
-• Changes in sleep or appetite
-• Irritability or mood swings
-• Procrastination or avoidance
-
-**Quick Stress Busters:**
-1. **4-7-8 Breathing**: Inhale 4 sec, hold 7 sec, exhale 8 sec
-2. **5-minute walk**: Movement releases tension
-3. **Brain dump**: Write everything on your mind
-4. **Cold water on wrists**: Activates calming response
-5. **Progressive muscle relaxation**: Tense and release each muscle group
-
-**Long-term Strategies:**
-• Regular exercise (even 20 min helps)
-• Consistent sleep schedule
-• Time blocking for work and rest
-• Saying "no" to overcommitment
-• Weekly planning sessions"""
-    },
-    
-    "anxiety": {
-        "title": "💭 Understanding Anxiety",
-        "content": """**Anxiety in College Students**
-
-Anxiety is the most common mental health concern for college students. You're not alone.
-
-**Types You Might Experience:**
-• **Generalized anxiety**: Constant worry about many things
-• **Social anxiety**: Fear of judgment in social situations
-• **Performance anxiety**: Stress about exams, presentations
-• **Panic attacks**: Sudden intense fear with physical symptoms
-
-**Grounding Techniques (5-4-3-2-1):**
-• 5 things you can SEE
-• 4 things you can TOUCH
-• 3 things you can HEAR
-• 2 things you can SMELL
-• 1 thing you can TASTE
-
-**When to Seek Help:**
-• Anxiety interferes with daily activities
-• You avoid situations due to fear
-• Physical symptoms are frequent
-• You're using substances to cope"""
-    },
-    
-    "depression": {
-        "title": "🌧️ Signs of Depression",
-        "content": """**Recognizing Depression**
-
-Depression is more than sadness—it's a persistent condition that affects how you think, feel, and function.
-
-**Warning Signs:**
-• Persistent sad, empty, or hopeless feelings
-• Loss of interest in activities you used to enjoy
-• Changes in appetite or weight
-• Sleeping too much or too little
-• Fatigue or loss of energy
-• Difficulty concentrating or making decisions
-• Feelings of worthlessness or excessive guilt
-• Thoughts of death or suicide
-
-**What Helps:**
-• Maintain routines (even basic ones)
-• Gentle movement and sunlight
-• Connect with one trusted person
-• Professional support (therapy, counseling)
-• Sometimes medication is helpful
-
-**Important:** Depression is treatable. Reaching out is a sign of strength, not weakness."""
-    },
-    
-    "sleep": {
-        "title": "😴 Sleep Hygiene",
-        "content": """**Better Sleep for Students**
-
-College schedules make good sleep challenging, but sleep affects everything—mood, memory, grades, and health.
-
-**Sleep Hygiene Basics:**
-1. **Consistent schedule**: Same bedtime/wake time (even weekends)
-2. **Screen curfew**: No phones/laptops 1 hour before bed
-3. **Cool, dark room**: 65-68°F is optimal
-4. **Caffeine cutoff**: None after 2 PM
-5. **Bed = sleep only**: Don't study in bed
-
-**Can't Sleep?**
-• Get up after 20 minutes of trying
-• Do something boring in dim light
-• Return when sleepy
-• Don't check the time
-
-**College-Specific Tips:**
-• White noise for noisy dorms
-• Eye mask if roommate has different schedule
-• Communicate boundaries with roommates
-• Naps before 3 PM, under 30 minutes"""
-    },
-    
-    "exam anxiety": {
-        "title": "📝 Exam Anxiety & Preparation",
-        "content": """**Managing Exam Stress**
-
-Some anxiety before exams is normal and can even help performance. Too much anxiety hurts it.
-
-**Before the Exam:**
-• Start early—cramming increases anxiety
-• Break material into chunks
-• Use active recall (test yourself)
-• Teach concepts to someone else
-• Get enough sleep (memory consolidation)
-
-**Night Before:**
-• Light review only (no new material)
-• Prepare everything you need
-• Relaxing activity before bed
-• Trust your preparation
-
-**During the Exam:**
-• Read all instructions first
-• Start with questions you know
-• Skip and return to hard ones
-• Breathe if you feel panicky
-• Don't compare pace with others
-
-**If You Blank Out:**
-• Close your eyes, breathe deeply
-• Start writing anything related
-• Move to another question
-• It will come back"""
-    },
-    
-    "loneliness": {
-        "title": "🤝 Loneliness & Building Connections",
-        "content": """**Feeling Lonely at College**
-
-Loneliness is incredibly common in college, even when surrounded by people. Social media makes it worse by showing everyone else's highlight reels.
-
-**Why It's Common:**
-• New environment, no established friendships
-• Everyone seems to have friends already (they don't)
-• Harder to make friends than in high school
-• Quality connections take time
-
-**Small Steps to Connect:**
-1. Say hi to someone in class
-2. Join ONE club or group
-3. Study in public spaces
-4. Accept invitations (even when tired)
-5. Be the one who initiates
-
-**Quality Over Quantity:**
-• One genuine friend > many acquaintances
-• Deep conversations > surface chat
-• Consistent contact > constant contact
-
-**Be Patient:**
-It takes 50+ hours of interaction to form a friendship. Give it time."""
-    },
-    
-    "homesickness": {
-        "title": "🏠 Dealing with Homesickness",
-        "content": """**Missing Home**
-
-Homesickness is grief for your old life while adjusting to a new one. It's completely normal.
-
-**What Helps:**
-• **Stay connected**: Regular calls/texts with family
-• **Bring comfort items**: Photos, favorite blanket, familiar snacks
-• **Create new routines**: Sunday morning coffee ritual, etc.
-• **Make your space yours**: Decorate, organize, nest
-• **Get involved**: Campus activities give purpose
-
-**What Doesn't Help:**
-• Going home every weekend (prevents adjustment)
-• Isolating in your room
-• Constant comparison to home
-• Refusing to try new things
-
-**Timeline:**
-• Weeks 1-3: Often the hardest
-• Month 2-3: Starts improving
-• End of semester: New normal forms
-
-It does get better. Give yourself grace during the transition."""
-    },
-    
-    "imposter syndrome": {
-        "title": "🎭 Imposter Syndrome",
-        "content": """**Feeling Like a Fraud**
-
-Imposter syndrome: believing you don't deserve your success and will be "found out" as incompetent.
-
-**Signs:**
-• Attributing success to luck, not skill
-• Downplaying achievements
-• Fear of being exposed
-• Overworking to prove worth
-• Difficulty accepting praise
-
-**Reality Check:**
-• 70% of people experience this
-• High achievers feel it MORE
-• Your acceptance wasn't a mistake
-• Others struggle too (they hide it)
-
-**Reframing Strategies:**
-1. Keep a "wins" file of accomplishments
-2. When you think "I got lucky," add "AND I worked hard"
-3. Talk to peers—they feel it too
-4. Mentor someone newer (you DO know things)
-5. "I'm learning" not "I'm failing"
-
-**Remember:** You don't have to feel confident to be competent."""
-    },
-    
-    "burnout": {
-        "title": "🔥 Academic Burnout",
-        "content": """**Recognizing & Recovering from Burnout**
-
-Burnout isn't laziness—it's exhaustion from prolonged stress without adequate recovery.
-
-**Signs of Burnout:**
-• Exhaustion that sleep doesn't fix
-• Cynicism about school/activities
-• Feeling ineffective despite effort
-• Emotional numbness
-• Physical symptoms (headaches, illness)
-
-**Recovery Steps:**
-1. **Acknowledge it**: This is real, not weakness
-2. **Reduce load**: Drop what you can (even temporarily)
-3. **Rest without guilt**: Recovery is productive
-4. **Set boundaries**: Learn to say no
-5. **Seek support**: Talk to advisor, counselor
-
-**Prevention:**
-• Build breaks into your schedule
-• Protect sleep and exercise
-• Have non-academic interests
-• Regular check-ins with yourself
-• Sustainable pace > sprint
-
-**The "hustle culture" lie:** Burning out doesn't mean you worked hard. It means you worked unsustainably."""
-    },
-    
-    "relationships": {
-        "title": "💕 Healthy Relationships",
-        "content": """**Building & Maintaining Healthy Relationships**
-
-College relationships (romantic, friendships, roommates) can be wonderful and challenging.
-
-**Signs of Healthy Relationships:**
-• Mutual respect and trust
-• Open communication
-• Supporting each other's goals
-• Maintaining individual identity
-• Healthy conflict resolution
-• Feeling safe to be yourself
-
-**Red Flags:**
-• Controlling behavior
-• Constant criticism
-• Isolation from friends/family
-• Jealousy presented as "caring"
-• Making you feel bad about yourself
-• Physical intimidation
-
-**Communication Tips:**
-• Use "I feel" statements
-• Listen to understand, not respond
-• Address issues early
-• It's okay to need space
-• Apologize meaningfully
-
-**Remember:** You deserve relationships that add to your life, not drain it."""
-    },
-    
-    "time management": {
-        "title": "⏰ Time Management",
-        "content": """**Managing Time in College**
-
-College gives you more freedom and less structure—this is both exciting and challenging.
-
-**Common Traps:**
-• Overcommitting
-• Underestimating task time
-• Procrastination spirals
-• All-nighters (they don't work)
-• No buffer time
-
-**Effective Strategies:**
-1. **Time blocking**: Schedule specific tasks
-2. **2-minute rule**: If it takes <2 min, do it now
-3. **Pomodoro**: 25 min work, 5 min break
-4. **Sunday planning**: Map out the week
-5. **Buffer time**: Things take longer than expected
-
-**Prioritization:**
-• **Urgent + Important**: Do first
-• **Important + Not urgent**: Schedule it
-• **Urgent + Not important**: Delegate/minimize
-• **Neither**: Eliminate
-
-**Energy Management:**
-Do hard tasks when you're most alert. Save easy tasks for low-energy times."""
-    },
-    
-    "mindfulness": {
-        "title": "🧘 Mindfulness Basics",
-        "content": """**Introduction to Mindfulness**
-
-Mindfulness: paying attention to the present moment without judgment. Simple concept, powerful practice.
-
-**Benefits:**
-• Reduced anxiety and stress
-• Improved focus
-• Better emotional regulation
-• Decreased rumination
-• Better sleep
-
-**Simple Practices:**
-1. **Mindful breathing**: Focus on breath for 1 minute
-2. **Body scan**: Notice sensations head to toe
-3. **Mindful eating**: Really taste your food
-4. **Walking meditation**: Feel each step
-5. **STOP technique**: Stop, Take a breath, Observe, Proceed
-
-**Common Misconceptions:**
-• You DON'T need to clear your mind
-• Thoughts are normal—notice and return to breath
-• 5 minutes counts
-• You can't do it "wrong"
-• It's a practice, not perfection
-
-**Start Small:**
-2 minutes daily > 20 minutes once a week. Consistency matters more than duration."""
-    },
-    
-    "self compassion": {
-        "title": "💚 Self-Compassion",
-        "content": """**Being Kind to Yourself**
-
-Self-compassion: treating yourself with the same kindness you'd offer a friend.
-
-**Three Components:**
-1. **Self-kindness** vs self-judgment
-2. **Common humanity** (everyone struggles) vs isolation
-3. **Mindfulness** vs over-identification with pain
-
-**Self-Compassion Break:**
-When struggling, say to yourself:
-• "This is a moment of suffering" (mindfulness)
-• "Suffering is part of life" (common humanity)
-• "May I be kind to myself" (self-kindness)
-
-**Reframing Self-Talk:**
-• Instead of: "I'm so stupid"
-• Try: "I'm struggling, and that's okay"
-
-• Instead of: "Everyone else has it together"
-• Try: "Everyone struggles with something"
-
-**Why It Matters:**
-Self-compassion increases resilience, motivation, and wellbeing. Self-criticism does the opposite."""
-    },
-    
-    "panic attacks": {
-        "title": "😰 Managing Panic Attacks",
-        "content": """**Understanding Panic Attacks**
-
-A panic attack is a sudden surge of intense fear with physical symptoms. They're terrifying but not dangerous.
-
-**Symptoms:**
-• Racing heart
-• Shortness of breath
-• Chest tightness
-• Dizziness
-• Tingling sensations
-• Feeling of unreality
-• Fear of dying or losing control
-
-**During a Panic Attack:**
-1. **Remember**: This will pass (usually 10-20 min)
-2. **Breathe slowly**: In for 4, out for 6
-3. **Ground yourself**: 5-4-3-2-1 technique
-4. **Don't fight it**: Resistance increases panic
-5. **Stay present**: "I am safe. This is temporary."
-
-**After:**
-• Be gentle with yourself
-• Rest if needed
-• Reflect on triggers
-• Consider professional support if recurring
-
-**Prevention:**
-Regular stress management, sleep, exercise, and limiting caffeine can reduce frequency."""
-    },
-    
-    "substance use": {
-        "title": "🍺 Substance Use Awareness",
-        "content": """**Making Informed Choices**
-
-College often involves exposure to alcohol and other substances. Here's what to know.
-
-**Alcohol Awareness:**
-• Standard drink = 12oz beer = 5oz wine = 1.5oz liquor
-• Your brain is still developing until ~25
-• "Everyone drinks" is a myth (many don't)
-• Hangovers affect next-day performance significantly
-
-**Warning Signs of Problem Use:**
-• Using to cope with stress/emotions
-• Blacking out
-• Needing more to feel effects
-• Neglecting responsibilities
-• Others expressing concern
-
-**Harm Reduction:**
-• Eat before drinking
-• Alternate with water
-• Never leave drinks unattended
-• Have a buddy system
-• Know how you're getting home
-
-**If You're Concerned:**
-• Campus health services
-• SAMHSA Helpline: 1-800-662-4357
-• It's okay to ask for help"""
-    },
-    
-    "grief": {
-        "title": "🕊️ Grief & Loss",
-        "content": """**Navigating Grief**
-
-Loss comes in many forms: death, breakups, friendships ending, leaving home, loss of identity or dreams.
-
-**Grief Isn't Linear:**
-The "stages" (denial, anger, bargaining, depression, acceptance) aren't steps. You may cycle through them randomly.
-
-**What's Normal:**
-• Waves of intense emotion
-• Feeling okay, then suddenly not
-• Physical symptoms (fatigue, appetite changes)
-• Difficulty concentrating
-• Questioning everything
-
-**What Helps:**
-• Let yourself feel (don't "should" yourself)
-• Talk to someone who listens without fixing
-• Maintain basic routines
-• Be patient with yourself
-• Create rituals of remembrance
-
-**Grief While in College:**
-It's hard to grieve while keeping up with classes. Talk to professors—most will understand. Use campus counseling."""
-    },
-    
-    "social anxiety": {
-        "title": "😓 Social Anxiety",
-        "content": """**Managing Social Anxiety**
-
-Social anxiety: intense fear of social situations due to fear of judgment or embarrassment.
-
-**Common Triggers:**
-• Meeting new people
-• Speaking in class
-• Eating in public
-• Group projects
-• Parties/social events
-
-**What's Happening:**
-Your brain overestimates threat and underestimates your ability to cope. Others notice your anxiety far less than you think.
-
-**Coping Strategies:**
-1. **Challenge thoughts**: "What's the evidence I'll be judged?"
-2. **Focus outward**: Listen to others vs. monitoring yourself
-3. **Gradual exposure**: Start with low-stakes situations
-4. **Prepare**: Having topics ready can help
-5. **Self-compassion**: Everyone feels awkward sometimes
-
-**Helpful Reframes:**
-• "I don't have to be perfect"
-• "Awkward moments pass"
-• "Most people are focused on themselves"
-• "I'm allowed to be quiet"
-
-**When to Seek Help:**
-If social anxiety significantly limits your life, therapy (especially CBT) is very effective."""
-    },
-    
-    "perfectionism": {
-        "title": "🎯 Perfectionism",
-        "content": """**When High Standards Hurt**
-
-Perfectionism: setting extremely high standards and being highly self-critical when you don't meet them.
-
-**Healthy Striving vs. Perfectionism:**
-• Healthy: "I want to do well"
-• Perfectionism: "I must be perfect or I'm a failure"
-
-**Signs:**
-• All-or-nothing thinking
-• Procrastination (fear of imperfection)
-• Difficulty celebrating achievements
-• Harsh self-criticism
-• Never feeling "good enough"
-• Avoiding challenges (might fail)
-
-**Costs of Perfectionism:**
-• Anxiety and depression
-• Burnout
-• Actually worse performance
-• Missed opportunities
-• Relationship strain
-
-**Recovery Strategies:**
-1. Set "good enough" goals
-2. Practice imperfection deliberately
-3. Notice and challenge all-or-nothing thoughts
-4. Celebrate effort, not just outcomes
-5. Ask: "Will this matter in 5 years?"
-
-**Remember:** Done is better than perfect. Progress over perfection."""
-    },
-    
-    "financial stress": {
-        "title": "💰 Financial Stress",
-        "content": """**Managing Money Stress**
-
-Financial stress is real stress. It affects mental health, academic performance, and relationships.
-
-**Common Concerns:**
-• Tuition and loans
-• Daily expenses
-• Work-school balance
-• Comparing to others
-• Family expectations
-
-**Practical Steps:**
-1. **Know your numbers**: Track spending for one week
-2. **Basic budget**: Needs, wants, savings
-3. **Use campus resources**: Food pantries, emergency funds
-4. **Financial aid office**: They can help more than you think
-5. **Student discounts**: Always ask
-
-**Part-Time Work Balance:**
-• 15-20 hours/week generally manageable
-• On-campus jobs often more flexible
-• Work-study can be helpful
-
-**If You're Struggling:**
-• Talk to financial aid BEFORE a crisis
-• Many schools have emergency funds
-• Food insecurity support exists
-• You're not alone in this
-
-**Mindset:** Financial stress doesn't define your worth or future."""
-    },
-    
-    "seeking help": {
-        "title": "🆘 When & How to Seek Help",
-        "content": """**Reaching Out for Support**
-
-Asking for help is a strength, not a weakness. Knowing when and how to seek help is an important life skill.
-
-**Signs You Should Talk to Someone:**
-• Feelings that won't go away
-• Difficulty functioning (classes, relationships, self-care)
-• Using substances to cope
-• Thoughts of self-harm
-• Feeling hopeless
-• Significant changes in sleep, appetite, energy
-
-**Campus Resources:**
-• **Counseling Center**: Usually free for students
-• **Health Services**: Can address physical symptoms
-• **Dean of Students**: Academic accommodations
-• **RA/Resident Advisor**: First point of contact
-
-**What to Expect:**
-• Initial assessment/intake
-• You'll discuss what's bringing you in
-• Together you'll make a plan
-• Confidential (with some legal exceptions)
-
-**If the Wait is Long:**
-• Ask about crisis appointments
-• Group therapy often has shorter waits
-• Online resources as supplement
-• Community mental health centers
-
-**Remember:** You don't have to be in crisis to seek help. Early support prevents bigger problems."""
-    }
-}
-
-# ============================================================================
-# 30-DAY WELLNESS CHALLENGE
-# ============================================================================
-
-WELLNESS_CHALLENGES = [
-    {"day": 1, "title": "Gratitude Start", "task": "Write down 3 things you're grateful for today. They can be small—a warm coffee, a text from a friend, sunshine.", "category": "mindfulness"},
-    {"day": 2, "title": "Hydration Check", "task": "Drink 8 glasses of water today. Set reminders if needed. Notice how your body feels.", "category": "physical"},
-    {"day": 3, "title": "Digital Sunset", "task": "Put your phone away 30 minutes before bed. Read, stretch, or just be.", "category": "sleep"},
-    {"day": 4, "title": "Reach Out", "task": "Send a message to someone you haven't talked to in a while. Just say hi.", "category": "connection"},
-    {"day": 5, "title": "Movement Joy", "task": "Do 10 minutes of movement you enjoy—dance, walk, stretch, anything.", "category": "physical"},
-    {"day": 6, "title": "Mindful Meal", "task": "Eat one meal without screens. Notice the flavors, textures, and how your body feels.", "category": "mindfulness"},
-    {"day": 7, "title": "Reflection", "task": "Journal for 5 minutes: How has your week been? What do you need more of?", "category": "reflection"},
-    {"day": 8, "title": "Nature Break", "task": "Spend 15 minutes outside. No phone. Just notice your surroundings.", "category": "mindfulness"},
-    {"day": 9, "title": "Boundary Practice", "task": "Say 'no' to one thing today that doesn't serve you. Notice how it feels.", "category": "self-care"},
-    {"day": 10, "title": "Sleep Sanctuary", "task": "Make your sleep space more comfortable—tidy up, adjust lighting, fresh sheets.", "category": "sleep"},
-    {"day": 11, "title": "Compliment Day", "task": "Give three genuine compliments today—to others or yourself.", "category": "connection"},
-    {"day": 12, "title": "Breathing Space", "task": "Practice 4-7-8 breathing (inhale 4, hold 7, exhale 8) three times today.", "category": "mindfulness"},
-    {"day": 13, "title": "Nourish", "task": "Eat one extra serving of fruits or vegetables today.", "category": "physical"},
-    {"day": 14, "title": "Weekly Check-in", "task": "Rate your week 1-10. What worked? What needs adjustment?", "category": "reflection"},
-    {"day": 15, "title": "Act of Kindness", "task": "Do something kind for someone else—hold a door, buy a coffee, send encouragement.", "category": "connection"},
-    {"day": 16, "title": "Creative Expression", "task": "Spend 15 minutes on something creative—draw, write, play music, craft.", "category": "self-care"},
-    {"day": 17, "title": "Body Scan", "task": "Do a 5-minute body scan meditation. Notice areas of tension without judgment.", "category": "mindfulness"},
-    {"day": 18, "title": "Social Media Fast", "task": "Take a break from social media for the entire day. Notice how you feel.", "category": "self-care"},
-    {"day": 19, "title": "Learn Something", "task": "Spend 20 minutes learning something new just for fun—not for class.", "category": "growth"},
-    {"day": 20, "title": "Declutter", "task": "Organize one small space (desk, drawer, bag). External order helps internal calm.", "category": "self-care"},
-    {"day": 21, "title": "Three-Week Reflection", "task": "You're 3 weeks in! Write about what changes you've noticed.", "category": "reflection"},
-    {"day": 22, "title": "Morning Mindfulness", "task": "Before checking your phone, take 5 deep breaths and set an intention for the day.", "category": "mindfulness"},
-    {"day": 23, "title": "Movement Challenge", "task": "Take the stairs all day, or do 20 squats every few hours.", "category": "physical"},
-    {"day": 24, "title": "Forgiveness", "task": "Write about something you need to forgive—yourself or someone else. You don't have to share it.", "category": "reflection"},
-    {"day": 25, "title": "Connection Deep Dive", "task": "Have a meaningful conversation with someone. Ask real questions. Listen fully.", "category": "connection"},
-    {"day": 26, "title": "Joy List", "task": "Make a list of 10 things that bring you joy. Do at least one today.", "category": "self-care"},
-    {"day": 27, "title": "Affirmation Day", "task": "Choose 3 affirmations and repeat them throughout the day. Write them somewhere visible.", "category": "mindfulness"},
-    {"day": 28, "title": "Future Self Letter", "task": "Write a letter to yourself 6 months from now. What do you hope for?", "category": "reflection"},
-    {"day": 29, "title": "Celebration", "task": "Celebrate yourself today. You've almost completed 30 days! Do something you enjoy.", "category": "self-care"},
-    {"day": 30, "title": "Integration", "task": "Reflect: Which practices will you continue? What have you learned about yourself?", "category": "reflection"}
+# Stored as JSON under content/ and loaded lazily: each resource, exercise,
+# meditation and coping list is read the first time it is requested.
+
+RESOURCE_LIBRARY = catalog("resource_library")          # 20+ mental health topics
+WELLNESS_CHALLENGES = collection("wellness_challenges")  # 30-day wellness challenge
+DAILY_AFFIRMATIONS = collection("daily_affirmations")
+BREATHING_EXERCISES = catalog("breathing_exercises")
+MEDITATION_SCRIPTS = catalog("meditation_scripts")
+COPING_STRATEGIES = catalog("coping_strategies")        # emotion-specific
+
+CONTENT_COLLECTIONS = [
+    RESOURCE_LIBRARY, WELLNESS_CHALLENGES, DAILY_AFFIRMATIONS,
+    BREATHING_EXERCISES, MEDITATION_SCRIPTS, COPING_STRATEGIES
 ]
 
-DAILY_AFFIRMATIONS = [
-    "I am worthy of rest and recovery.",
-    "My feelings are valid, even when they're difficult.",
-    "I am doing the best I can with what I have.",
-    "It's okay to ask for help.",
-    "I am more than my grades or productivity.",
-    "This difficult moment will pass.",
-    "I deserve compassion, especially from myself.",
-    "Progress, not perfection.",
-    "I am enough, exactly as I am.",
-    "My mental health matters.",
-    "I can handle challenges one step at a time.",
-    "It's okay to not have everything figured out.",
-    "I am learning and growing every day.",
-    "My worth is not determined by others' opinions.",
-    "I give myself permission to take breaks.",
-    "Struggling doesn't mean failing.",
-    "I am resilient.",
-    "Today, I choose to be kind to myself.",
-    "I trust my ability to get through this.",
-    "I am allowed to set boundaries."
-]
+# Edited content files are picked up without a restart; 0 disables checks
+CONTENT_RELOAD_SECONDS = float(os.getenv("CONTENT_RELOAD_SECONDS", "10"))
+content_checked_at = time.monotonic()
 
 # ============================================================================
 # CRISIS RESOURCES
@@ -830,328 +330,557 @@ CRISIS_KEYWORDS = [
 ]
 
 # ============================================================================
-# GUIDED EXERCISES
+# SCENARIO KEYWORDS
 # ============================================================================
 
-BREATHING_EXERCISES = {
-    "box": {
-        "name": "Box Breathing",
-        "content": """
-**Box Breathing Exercise** 📦
+SCENARIO_KEYWORDS = {
+    "exam_anxiety": ["exam", "test", "finals", "midterm", "grade", "gpa", "study", "fail class"],
+    "loneliness": ["lonely", "alone", "no friends", "isolated", "left out", "nobody likes"],
+    "homesickness": ["miss home", "homesick", "miss my family", "miss my mom", "miss my dad", "far from home"],
+    "burnout": ["burnout", "burned out", "exhausted", "tired of everything", "can't keep up", "overwhelmed"],
+    "imposter_syndrome": ["imposter", "don't belong", "fraud", "not smart enough", "everyone else is better", "mistake admitting me"],
+    "relationship_issues": ["relationship", "boyfriend", "girlfriend", "partner", "breakup", "broke up", "fight with", "roommate problem"],
+    "depression_feelings": ["depressed", "depression", "hopeless", "empty", "numb", "don't care anymore", "what's the point"],
+    "sleep_issues": ["can't sleep", "insomnia", "sleep", "tired", "exhausted", "nightmares", "sleeping too much"],
+    "financial_stress": ["money", "afford", "broke", "debt", "loan", "financial", "pay for", "expensive"],
+    "future_anxiety": ["future", "career", "job", "after graduation", "what am i doing", "life after college", "don't know what to do"]
+}
 
-Used by Navy SEALs to stay calm under pressure.
+# Crisis keywords compiled once into a single-pass substring matcher
+KEYWORD_MATCHER = KeywordMatcher({"crisis": CRISIS_KEYWORDS})
 
-1. **Inhale** slowly for 4 seconds
-2. **Hold** your breath for 4 seconds
-3. **Exhale** slowly for 4 seconds
-4. **Hold** empty for 4 seconds
+# Scenario keywords compiled once into a word-boundary scored classifier
+SCENARIO_CLASSIFIER = ScenarioClassifier(SCENARIO_KEYWORDS)
+
+# Number of ranked scenario prompts injected into the AI context, and the
+# confidence a secondary scenario needs to be included
+SCENARIO_TOP_K = int(os.getenv("SCENARIO_TOP_K", "1"))
+SCENARIO_MIN_CONFIDENCE = float(os.getenv("SCENARIO_MIN_CONFIDENCE", "0.25"))
+
+# ============================================================================
+# USER SESSION MANAGEMENT
+# ============================================================================
 
-Repeat 4 times.
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "21600"))
 
-This activates your parasympathetic nervous system and reduces stress hormones.
+# "memory" keeps sessions in this process; "sqlite" shares them between
+# worker processes on the same host through SESSION_DB_PATH
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
 
-How do you feel? 💙"""
-    },
-    "478": {
-        "name": "4-7-8 Breathing",
-        "content": """
-**4-7-8 Breathing Exercise** 🌬️
+# Conversation turns kept per session (older turns live on in the summary)
+HISTORY_CAPACITY = 20
 
-Dr. Andrew Weil's relaxation technique.
+if SESSION_BACKEND == "sqlite":
+    session_backend = SQLiteSessionBackend(
+        os.getenv("SESSION_DB_PATH", "calmspace_sessions.db"),
+        ttl_seconds=SESSION_TTL_SECONDS,
+        history_capacity=HISTORY_CAPACITY
+    )
+else:
+    # Idle sessions expire after SESSION_TTL_SECONDS; the least recently used
+    # session is evicted once SESSION_MAX_ENTRIES are stored
+    session_backend = MemorySessionBackend(SessionStore(
+        max_entries=int(os.getenv("SESSION_MAX_ENTRIES", "10000")),
+        ttl_seconds=SESSION_TTL_SECONDS
+    ), history_capacity=HISTORY_CAPACITY)
 
-1. **Exhale** completely through your mouth
-2. **Inhale** quietly through your nose for **4 seconds**
-3. **Hold** your breath for **7 seconds**
-4. **Exhale** completely through your mouth for **8 seconds**
 
-Repeat 4 times.
+def get_session_id() -> str:
+    """Return the ID of the current Chainlit session."""
+    return cl.user_session.get("id", "default")
 
-This is especially good for anxiety and falling asleep.
 
-How are you feeling now? 💙"""
-    },
-    "grounding": {
-        "name": "5-4-3-2-1 Grounding",
-        "content": """
-**5-4-3-2-1 Grounding Exercise** 🌳
+def get_user_session():
+    """Get or create user session data."""
+    return session_backend.load(get_session_id())
 
-Brings you back to the present moment.
 
-Look around and find:
+def save_user_session(session: dict):
+    """Persist challenge progress changed on a session."""
+    session_backend.save(get_session_id(), session)
 
-👀 **5 things you can SEE**
-(Name them out loud or in your mind)
 
-✋ **4 things you can TOUCH**
-(Feel their texture)
+def add_to_conversation(role: str, content: str):
+    """Add message to the conversation ring buffer (oldest dropped at capacity)."""
+    session_backend.append_conversation(get_session_id(), ConversationTurn(role, content, time.time()))
 
-👂 **3 things you can HEAR**
-(Near or far away)
 
-👃 **2 things you can SMELL**
-(Or 2 scents you like)
+def log_mood(mood: str, intensity: int):
+    """Log a mood entry."""
+    session_backend.append_mood(get_session_id(), {
+        "mood": mood,
+        "intensity": intensity,
+        "timestamp": time.time()
+    })
 
-👅 **1 thing you can TASTE**
-(Or imagine a favorite taste)
 
-Take a deep breath. You are here. You are safe.
+# ============================================================================
+# AI RESPONSE FUNCTIONS
+# ============================================================================
 
-How do you feel now? 💙"""
-    }
-}
+def classify_scenarios(message: str) -> list:
+    """Rank the mental health scenarios a message relates to, with confidence."""
+    return SCENARIO_CLASSIFIER.classify(message)
 
-MEDITATION_SCRIPTS = {
-    "calm": {
-        "name": "2-Minute Calm",
-        "content": """
-**2-Minute Calm** 🧘
 
-Find a comfortable position. Close your eyes if that feels okay.
+def detect_scenario(message: str) -> Optional[str]:
+    """Detect which mental health scenario the message relates to."""
+    ranked = classify_scenarios(message)
+    return ranked[0][0] if ranked else None
 
-Take a deep breath in... and slowly let it out.
 
-Notice your feet on the ground. Feel the support beneath you.
+def select_scenarios(message: str, top_k: int = SCENARIO_TOP_K) -> list:
+    """Return up to top_k scenarios for the AI context, best first."""
+    ranked = classify_scenarios(message)[:top_k]
+    return [scenario for i, (scenario, confidence) in enumerate(ranked)
+            if i == 0 or confidence >= SCENARIO_MIN_CONFIDENCE]
 
-Breathe in calm... breathe out tension.
 
-You don't need to change anything right now. Just be here.
+def check_crisis(message: str) -> bool:
+    """Check if message contains crisis indicators."""
+    return any(match.label == "crisis" for match in KEYWORD_MATCHER.find_all(message))
 
-One more deep breath... and when you're ready, gently open your eyes.
 
-You can return to this moment whenever you need it. 💙"""
-    },
-    "body scan": {
-        "name": "Quick Body Scan",
-        "content": """
-**Quick Body Scan** 🌟
+def record_reply_timing(started: float, first_token: Optional[float], streamed: bool,
+                        prompt_tokens: int, cached: bool = False, coalesced: bool = False):
+    """Record prompt size, time-to-first-token and total latency for one AI reply."""
+    finished = time.perf_counter()
+    stage = "response_cache" if cached else "coalesced" if coalesced else "llm"
+    metrics.observe("stage_seconds", finished - started, stage=stage)
+    metrics.observe("llm_first_token_seconds", (first_token or finished) - started,
+                    streamed=streamed, cached=cached)
+    metrics.observe("prompt_tokens", prompt_tokens)
 
-Close your eyes. Take three deep breaths.
 
-**Head**: Notice any tension in your forehead, jaw, or neck. Soften.
+# Fields for the event of the message being handled, filled in as it
+# moves through the pipeline and logged by record_route()
+message_event: ContextVar[Optional[dict]] = ContextVar("message_event", default=None)
 
-**Shoulders**: Let them drop away from your ears. Release.
 
-**Arms & Hands**: Unclench your fists. Let your hands be heavy.
+def note_event(**fields):
+    """Add fields to the current message's event."""
+    event = message_event.get()
+    if event is not None:
+        event.update(fields)
 
-**Chest**: Notice your breath. No need to change it.
 
-**Stomach**: Release any holding or tightness.
+def shared_prompt_key(messages: list, context_stats, user_message: str,
+                      max_history: int) -> Optional[str]:
+    """Return the key of a prompt whose reply may be shared, or None if it must not be."""
+    if context_stats.turns_included > max_history or check_crisis(user_message):
+        return None
+    return prompt_key(messages[:-1], user_message)
 
-**Legs & Feet**: Feel them supported by the ground.
 
-Take one more breath. You are whole. You are here. 💙"""
-    },
-    "self compassion": {
-        "name": "Self-Compassion Meditation",
-        "content": """
-**Self-Compassion Meditation** 💚
+def response_cache_key(messages: list, context_stats, user_message: str) -> Optional[str]:
+    """Return the cache key for a prompt, or None if its reply must not be cached."""
+    if response_cache is None:
+        return None
+    return shared_prompt_key(messages, context_stats, user_message, RESPONSE_CACHE_MAX_HISTORY)
 
-Place your hand on your heart. Feel its warmth.
 
-Repeat silently or aloud:
+def coalescing_key(messages: list, context_stats, user_message: str) -> Optional[str]:
+    """Return the key identical in-flight prompts share, or None if this one must run alone."""
+    if not REQUEST_COALESCING_ENABLED:
+        return None
+    return shared_prompt_key(messages, context_stats, user_message, max_history=0)
 
-*"This is a moment of difficulty."*
-(Acknowledge what you're feeling)
 
-*"Difficulty is part of being human."*
-(You're not alone in this)
+def build_messages(user_message: str, scenarios: Optional[list] = None,
+                   passages: Optional[list] = None):
+    """Build the chat completion messages for a user message within the token budget."""
+    session = get_user_session()
+    
+    # System prompt plus scenario-specific guidance for each detected scenario
+    system_prompts = [MAIN_SYSTEM_PROMPT]
+    for scenario in scenarios or []:
+        if scenario in SCENARIO_PROMPTS:
+            system_prompts.append(f"Context: {SCENARIO_PROMPTS[scenario]}")
+    
+    # Retrieved library passages, so the reply can build on local content
+    if passages:
+        system_prompts.append(format_library_context(passages))
+    
+    # The current message is already the last history entry; don't send it twice
+    history = session["conversation_history"]
+    is_latest = bool(history) and history[-1].role == "user" and history[-1].content == user_message
+    
+    return build_context(
+        system_prompts, history, user_message,
+        skip_latest=int(is_latest),
+        budget=PROMPT_TOKEN_BUDGET,
+        max_turns=HISTORY_MAX_TURNS,
+        turn_max_tokens=HISTORY_TURN_MAX_TOKENS,
+        summary=session.get("summary", "")
+    )
 
-*"May I be kind to myself."*
-(You deserve compassion)
 
-*"May I give myself the compassion I need."*
-(Let it in)
+def local_fallback_reply(passages: Optional[list] = None) -> str:
+    """Reply without the AI: the best library passage if one matched, else the fallback text."""
+    if passages:
+        return get_library_answer(passages)
+    return FALLBACK_RESPONSE
 
-Breathe. You are worthy of kindness—especially your own. 💚"""
-    }
-}
 
-# ============================================================================
-# COPING STRATEGIES (Emotion-Specific)
-# ============================================================================
+async def get_ai_response(user_message: str, scenarios: Optional[list] = None,
+                          passages: Optional[list] = None) -> str:
+    """Get AI response with appropriate context."""
+    with metrics.span("prompt_build"):
+        messages, context_stats = build_messages(user_message, scenarios, passages)
+    started = time.perf_counter()
+    
+    note_event(prompt_tokens=context_stats.prompt_tokens,
+               turns_included=context_stats.turns_included)
+    cache_key = response_cache_key(messages, context_stats, user_message)
+    cached = response_cache.get(cache_key) if cache_key else None
+    note_event(cached=cached is not None)
+    if cached is not None:
+        record_reply_timing(started, None, streamed=False,
+                            prompt_tokens=context_stats.prompt_tokens, cached=True)
+        return cached
+    
+    flight_key = coalescing_key(messages, context_stats, user_message)
+    flight = single_flight.join(flight_key)
+    while flight is not None:
+        note_event(coalesced=True)
+        try:
+            content = await flight.result()
+        except FlightAbandoned:
+            # The leading request was cancelled: follow whichever request
+            # took over from it, or lead a fresh one
+            flight = single_flight.join(flight_key)
+            continue
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            note_event(error=type(e).__name__, error_message=str(e))
+            content = local_fallback_reply(passages)
+        record_reply_timing(started, None, streamed=False,
+                            prompt_tokens=context_stats.prompt_tokens, coalesced=True)
+        return content
+    note_event(coalesced=False)
+    
+    async def complete(endpoint):
+        return await endpoint.client.chat.completions.create(
+            model=endpoint.model,
+            messages=messages,
+            temperature=endpoint.temperature,
+            max_tokens=endpoint.max_tokens
+        )
+    
+    with single_flight.lead(flight_key) as flight:
+        queued = time.perf_counter()
+        async with ai_admission.admit():
+            called = None
+            try:
+                # Queuing for admission and a local slot is its own stage;
+                # the llm stage times only the upstream call
+                async with llm_semaphore:
+                    called = time.perf_counter()
+                    metrics.observe("stage_seconds", called - queued, stage="admission_wait")
+                    endpoint, response = await llm_caller.call(lambda: llm_router.call(complete, kind="chat"))
+                note_event(endpoint=endpoint.name)
+                content = response.choices[0].message.content
+                if content:
+                    flight.publish(content)
+                if response.usage:
+                    note_event(prompt_tokens=response.usage.prompt_tokens,
+                               completion_tokens=response.usage.completion_tokens)
+                if cache_key and content:
+                    response_cache.put(cache_key, content)
+                return content
+            except Exception as e:
+                flight.finish(e)
+                note_event(error=type(e).__name__, error_message=str(e))
+                return local_fallback_reply(passages)
+            finally:
+                if called is not None:
+                    record_reply_timing(called, None, streamed=False,
+                                        prompt_tokens=context_stats.prompt_tokens)
+
+
+async def stream_ai_response(user_message: str, scenarios: Optional[list], msg: cl.Message,
+                             passages: Optional[list] = None) -> str:
+    """Stream an AI response into a Chainlit message and return the full text."""
+    with metrics.span("prompt_build"):
+        messages, context_stats = build_messages(user_message, scenarios, passages)
+    started = time.perf_counter()
+    first_token = None
+    
+    note_event(prompt_tokens=context_stats.prompt_tokens,
+               turns_included=context_stats.turns_included)
+    cache_key = response_cache_key(messages, context_stats, user_message)
+    cached = response_cache.get(cache_key) if cache_key else None
+    note_event(cached=cached is not None)
+    if cached is not None:
+        await msg.stream_token(cached)
+        record_reply_timing(started, time.perf_counter(), streamed=True,
+                            prompt_tokens=context_stats.prompt_tokens, cached=True)
+        with metrics.span("send"):
+            await msg.send()
+        return msg.content
+    
+    flight_key = coalescing_key(messages, context_stats, user_message)
+    flight = single_flight.join(flight_key)
+    while flight is not None:
+        note_event(coalesced=True)
+        try:
+            async for token in flight.stream():
+                if first_token is None:
+                    first_token = time.perf_counter()
+                await msg.stream_token(token)
+        except FlightAbandoned:
+            # The leading request was cancelled: drop its partial reply and
+            # follow whichever request took over from it, or lead a fresh one
+            if first_token is not None:
+                await msg.stream_token("", is_sequence=True)
+                first_token = None
+            flight = single_flight.join(flight_key)
+            continue
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            note_event(error=type(e).__name__, error_message=str(e))
+            if first_token is None:
+                await msg.stream_token(local_fallback_reply(passages))
+        record_reply_timing(started, first_token, streamed=True,
+                            prompt_tokens=context_stats.prompt_tokens, coalesced=True)
+        with metrics.span("send"):
+            await msg.send()
+        return msg.content
+    note_event(coalesced=False)
+    
+    async def open_stream(endpoint):
+        # An attempt lasts until the first chunk, so a stalled stream is
+        # retried (or hedged) before anything reaches the student
+        stream = await endpoint.client.chat.completions.create(
+            model=endpoint.model,
+            messages=messages,
+            temperature=endpoint.temperature,
+            max_tokens=endpoint.max_tokens,
+            stream=True
+        )
+        chunks = stream.__aiter__()
+        try:
+            return stream, chunks, await anext(chunks, None)
+        except BaseException:
+            await stream.close()  # timed out or cancelled before the first chunk
+            raise
+    
+    async def close_stream(opened):
+        await opened[0].close()
+    
+    async def received(chunks, first):
+        if first is not None:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+    
+    with single_flight.lead(flight_key) as flight:
+        queued = time.perf_counter()
+        async with ai_admission.admit():
+            called = None
+            try:
+                async with llm_semaphore:
+                    called = time.perf_counter()
+                    metrics.observe("stage_seconds", called - queued, stage="admission_wait")
+                    # Once chunks arrive there are no more retries; the rest of the
+                    # stream must arrive within what is left of the deadline
+                    deadline = llm_caller.deadline()
+                    endpoint, (stream, chunks, first) = await llm_caller.call(
+                        lambda: llm_router.call(open_stream, kind="stream", discard=close_stream), deadline)
+                    note_event(endpoint=endpoint.name)
+                    try:
+                        async with asyncio.timeout(llm_caller.remaining(deadline)):
+                            async for chunk in received(chunks, first):
+                                if not chunk.choices:
+                                    continue
+                                token = chunk.choices[0].delta.content
+                                if token:
+                                    if first_token is None:
+                                        first_token = time.perf_counter()
+                                    flight.publish(token)
+                                    await msg.stream_token(token)
+                    finally:
+                        await stream.close()  # also on timeout, send errors and cancellation
+                note_event(completion_tokens=count_tokens(msg.content))
+                if cache_key and msg.content:
+                    response_cache.put(cache_key, msg.content)
+            except Exception as e:
+                flight.finish(e)
+                note_event(error=type(e).__name__, error_message=str(e))
+                if first_token is None:
+                    await msg.stream_token(local_fallback_reply(passages))
+            finally:
+                if called is not None:
+                    record_reply_timing(called, first_token, streamed=True,
+                                        prompt_tokens=context_stats.prompt_tokens)
+    
+    with metrics.span("send"):
+        await msg.send()
+    return msg.content
 
-COPING_STRATEGIES = {
-    "anxiety": {
-        "title": "Coping with Anxiety",
-        "strategies": [
-            "Try the 5-4-3-2-1 grounding technique",
-            "Do box breathing (4-4-4-4 pattern)",
-            "Go for a short walk",
-            "Write down your worries and challenge each one",
-            "Call a friend or family member",
-            "Limit caffeine intake",
-            "Progressive muscle relaxation"
-        ]
-    },
-    "sadness": {
-        "title": "Coping with Sadness",
-        "strategies": [
-            "Let yourself feel it—crying is okay",
-            "Reach out to someone you trust",
-            "Do one small act of self-care",
-            "Listen to music that matches or shifts your mood",
-            "Write in a journal without judgment",
-            "Get some sunlight or fresh air",
-            "Be gentle with yourself"
-        ]
-    },
-    "anger": {
-        "title": "Coping with Anger",
-        "strategies": [
-            "Remove yourself from the situation if possible",
-            "Physical exercise or movement",
-            "Write an angry letter you won't send",
-            "Use cold water on your face or wrists",
-            "Count to 10 before responding",
-            "Deep breathing exercises",
-            "Identify the underlying emotion"
-        ]
-    },
-    "overwhelm": {
-        "title": "Coping with Overwhelm",
-        "strategies": [
-            "Brain dump everything on your mind",
-            "Pick ONE thing to focus on",
-            "Break tasks into smaller steps",
-            "It's okay to ask for an extension",
-            "5 minutes of deep breathing",
-            "Step away from the situation briefly",
-            "Ask for help"
-        ]
-    },
-    "general": {
-        "title": "General Coping Strategies",
-        "strategies": [
-            "Movement—even a short walk helps",
-            "Deep breathing exercises",
-            "Talk to someone you trust",
-            "Write it out in a journal",
-            "Do something with your hands (draw, craft, cook)",
-            "Change your environment",
-            "Practice self-compassion",
-            "Limit social media",
-            "Get outside in nature",
-            "Progressive muscle relaxation"
-        ]
-    }
-}
 
 # ============================================================================
-# USER SESSION MANAGEMENT
+# CONVERSATION SUMMARIES
 # ============================================================================
 
-user_sessions = {}
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a supportive conversation between a college student and CalmSpace, a mental health companion.
 
-def get_user_session():
-    """Get or create user session data."""
-    session_id = cl.user_session.get("id", "default")
-    if session_id not in user_sessions:
-        user_sessions[session_id] = {
-            "mood_history": [],
-            "conversation_history": [],
-            "challenge_day": 1,
-            "challenge_started": None
-        }
-    return user_sessions[session_id]
+Update the existing summary with the new turns. Keep what matters for continuing the conversation: what the student is going through, feelings and people they mentioned, strategies already suggested and how they responded, and any risk concerns.
 
+Write at most 120 words in plain sentences. Return only the updated summary."""
 
-def add_to_conversation(role: str, content: str):
-    """Add message to conversation history with limit."""
-    session = get_user_session()
-    session["conversation_history"].append({
-        "role": role,
-        "content": content,
-        "timestamp": datetime.now().isoformat()
-    })
-    # Keep last 20 messages for context
-    session["conversation_history"] = session["conversation_history"][-20:]
+# Sessions with a summary update in flight, and the tasks themselves so
+# they are not garbage collected before finishing
+summaries_in_progress = set()
+summary_tasks = set()
 
 
-def log_mood(mood: str, intensity: int):
-    """Log a mood entry."""
-    session = get_user_session()
-    session["mood_history"].append({
-        "mood": mood,
-        "intensity": intensity,
-        "timestamp": datetime.now().isoformat()
-    })
+def pending_summary_turns(session: dict) -> list:
+    """Return turns that have left the history window but are not yet summarized."""
+    history = session["conversation_history"]
+    turn_count = session.get("turn_count", len(history))
+    first_index = turn_count - len(history)
+    window_start = turn_count - HISTORY_MAX_TURNS
+    start = max(session.get("summarized_turns", 0), first_index)
+    if window_start <= start:
+        return []
+    return list(islice(history, start - first_index, window_start - first_index))
+
+
+async def update_summary(session_id: str):
+    """Fold turns that left the history window into the session summary."""
+    try:
+        session = session_backend.load(session_id)
+        turns = pending_summary_turns(session)
+        if not turns:
+            return
+        summarized_upto = session["turn_count"] - HISTORY_MAX_TURNS
+        transcript = "\n".join(f"{turn.role}: {turn.content}" for turn in turns)
+        
+        async def summarize(endpoint):
+            return await endpoint.client.chat.completions.create(
+                model=endpoint.model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Existing summary:\n{session.get('summary') or '(none)'}\n\nNew turns:\n{transcript}"}
+                ],
+                temperature=0.3,
+                max_tokens=SUMMARY_MAX_TOKENS
+            )
+        
+        async with llm_semaphore:
+            _, response = await llm_caller.call(lambda: llm_router.call(summarize, kind="summary", hedge=False))
+        summary = (response.choices[0].message.content or "").strip()
+        if summary:
+            session_backend.save_summary(session_id, summary, summarized_upto)
+    except Exception as e:
+        event_log.error("summary_update_failed", e, session=event_log.session_hash(session_id))
+    finally:
+        summaries_in_progress.discard(session_id)
+
+
+def schedule_summary_update():
+    """Start a background summary update once enough turns are pending."""
+    if not SUMMARY_ENABLED:
+        return
+    session_id = get_session_id()
+    if session_id in summaries_in_progress:
+        return
+    if len(pending_summary_turns(get_user_session())) < SUMMARY_BATCH_TURNS:
+        return
+    summaries_in_progress.add(session_id)
+    task = asyncio.create_task(update_summary(session_id))
+    summary_tasks.add(task)
+    task.add_done_callback(summary_tasks.discard)
 
 
 # ============================================================================
-# AI RESPONSE FUNCTIONS
+# RENDER CACHE
 # ============================================================================
 
-def detect_scenario(message: str) -> Optional[str]:
-    """Detect which mental health scenario the message relates to."""
-    message_lower = message.lower()
-    
-    scenario_keywords = {
-        "exam_anxiety": ["exam", "test", "finals", "midterm", "grade", "gpa", "study", "fail class"],
-        "loneliness": ["lonely", "alone", "no friends", "isolated", "left out", "nobody likes"],
-        "homesickness": ["miss home", "homesick", "miss my family", "miss my mom", "miss my dad", "far from home"],
-        "burnout": ["burnout", "burned out", "exhausted", "tired of everything", "can't keep up", "overwhelmed"],
-        "imposter_syndrome": ["imposter", "don't belong", "fraud", "not smart enough", "everyone else is better", "mistake admitting me"],
-        "relationship_issues": ["relationship", "boyfriend", "girlfriend", "partner", "breakup", "broke up", "fight with", "roommate problem"],
-        "depression_feelings": ["depressed", "depression", "hopeless", "empty", "numb", "don't care anymore", "what's the point"],
-        "sleep_issues": ["can't sleep", "insomnia", "sleep", "tired", "exhausted", "nightmares", "sleeping too much"],
-        "financial_stress": ["money", "afford", "broke", "debt", "loan", "financial", "pay for", "expensive"],
-        "future_anxiety": ["future", "career", "job", "after graduation", "what am i doing", "life after college", "don't know what to do"]
-    }
-    
-    for scenario, keywords in scenario_keywords.items():
-        if any(keyword in message_lower for keyword in keywords):
-            return scenario
-    
-    return None
+# Static responses rendered once and served by reference: (name, args) -> text
+render_cache = {}
 
 
-def check_crisis(message: str) -> bool:
-    """Check if message contains crisis indicators."""
-    message_lower = message.lower()
-    return any(keyword in message_lower for keyword in CRISIS_KEYWORDS)
+def cached_render(func):
+    """Serve a static response from the render cache, rendering it on first use."""
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = (func.__name__, args)
+        rendered = render_cache.get(key)
+        if rendered is None:
+            rendered = render_cache[key] = func(*args)
+        return rendered
+    return wrapper
 
 
-async def get_ai_response(user_message: str, scenario: Optional[str] = None) -> str:
-    """Get AI response with appropriate context."""
-    session = get_user_session()
-    
-    # Build conversation context
-    messages = [{"role": "system", "content": MAIN_SYSTEM_PROMPT}]
-    
-    # Add scenario-specific guidance if detected
-    if scenario and scenario in SCENARIO_PROMPTS:
-        messages.append({
-            "role": "system", 
-            "content": f"Context: {SCENARIO_PROMPTS[scenario]}"
-        })
-    
-    # Add recent conversation history
-    for msg in session["conversation_history"][-10:]:
-        messages.append({
-            "role": msg["role"],
-            "content": msg["content"]
-        })
-    
-    # Add current message
-    messages.append({"role": "user", "content": user_message})
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=500
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        print(f"OpenAI API Error: {e}")
-        return "I'm having trouble connecting right now. Please try again in a moment. If you're in crisis, please type 'crisis' for helpline numbers. 💙"
+def warm_render_cache():
+    """Render every static response up front."""
+    get_welcome_message()
+    get_crisis_response()
+    get_menu()
+    get_resource_menu()
+    get_breathing_menu()
+    get_meditation_menu()
+    for emotion in [None, *COPING_STRATEGIES]:
+        get_coping_strategies(emotion)
+
+
+def invalidate_render_cache():
+    """Drop rendered responses after content changes, and render them again."""
+    render_cache.clear()
+    warm_render_cache()
 
 
 # ============================================================================
 # COMMAND HANDLERS
 # ============================================================================
 
+@cached_render
+def get_welcome_message() -> str:
+    """Return the welcome message shown at chat start."""
+    return """
+**🌿 Welcome to CalmSpace**
+
+I'm here to support you through whatever you're experiencing—stress, anxiety, loneliness, exam pressure, or just needing someone to talk to.
+
+**This is a safe, judgment-free space.** 💙
+
+**Commands you can use:**
+• **menu** — See all options
+• **mood** — Track your mood
+• **challenge** — Daily wellness challenge
+• **resources** — Browse mental health topics
+• **breathe** — Breathing exercises
+• **meditate** — Quick meditations
+• **journal** — Journal prompts
+• **coping** — Coping strategies
+• **search** — Search topics and exercises
+• **crisis** — Crisis helplines
+
+Or just tell me how you're feeling. **How are you doing today?**
+
+*Note: I'm an AI companion, not a replacement for professional help. If you're in crisis, type 'crisis' for immediate resources.*
+"""
+
+
+@cached_render
+def get_crisis_response() -> str:
+    """Return the reply sent when crisis indicators are detected."""
+    return f"""
+I hear that you're going through something really difficult right now, and I'm genuinely concerned about you. 💙
+
+What you're feeling is real, and you deserve support.
+
+{CRISIS_RESOURCES}
+
+I'm here if you want to talk, but please also reach out to one of these resources. You don't have to go through this alone.
+"""
+
+
+@cached_render
 def get_menu() -> str:
     """Return the main menu."""
     return """
@@ -1167,45 +896,161 @@ Here's what I can help you with:
 **🧘 meditate** — Quick meditation scripts
 **📝 journal** — Journaling prompts
 **💪 coping** — Coping strategies
+**🔎 search** — Search all topics and exercises
 **🆘 crisis** — Crisis resources
 
 Just type the command or tell me what's on your mind. I'm here to listen. 💙
 """
 
 
+@cached_render
 def get_resource_menu() -> str:
     """Return the resource library menu."""
     topics = list(RESOURCE_LIBRARY.keys())
     menu = "**📚 Resource Library**\n\nChoose a topic to learn more:\n\n"
     
+    # Titles come from the catalog manifest, so no topic content is loaded
     for i, topic in enumerate(topics, 1):
-        title = RESOURCE_LIBRARY[topic]["title"]
+        title = RESOURCE_LIBRARY.label(topic)
         menu += f"{i}. {title}\n"
     
     menu += "\nType the topic name (e.g., 'anxiety') or number to view."
     return menu
 
 
+def build_resource_index() -> ResourceIndex:
+    """Index topic keys and titles (the manifest's menu labels) for resource lookups."""
+    return ResourceIndex(
+        {key: RESOURCE_LIBRARY.label(key) for key in RESOURCE_LIBRARY},
+        max_query_terms=int(os.getenv("RESOURCE_MAX_QUERY_TERMS", "4")),
+        min_match=float(os.getenv("RESOURCE_MIN_MATCH", "1.0"))
+    )
+
+
 def get_resource(query: str) -> Optional[str]:
     """Get a specific resource by name or number."""
-    query_lower = query.lower().strip()
-    topics = list(RESOURCE_LIBRARY.keys())
-    
-    # Check if it's a number
-    try:
-        num = int(query_lower)
-        if 1 <= num <= len(topics):
-            topic = topics[num - 1]
-            return RESOURCE_LIBRARY[topic]["content"]
-    except ValueError:
-        pass
-    
-    # Check by name (partial match)
-    for key, value in RESOURCE_LIBRARY.items():
-        if query_lower in key.lower() or query_lower in value["title"].lower():
-            return value["content"]
-    
-    return None
+    # Short topic-like queries are looked up term by term; everything else
+    # goes straight to the AI
+    topic = get_content_index("resources").lookup(query)
+    return RESOURCE_LIBRARY[topic]["content"] if topic else None
+
+
+def content_documents():
+    """
+    Yield (command, title, text) for every resource, coping strategy and exercise.
+
+    Items are read without being kept in their catalogs: the indexes built
+    from them hold the passage text they need, so only items a student
+    actually opens stay loaded.
+    """
+    for key in RESOURCE_LIBRARY:
+        value = RESOURCE_LIBRARY.read(key)
+        yield key, value["title"], value["content"]
+    for key in COPING_STRATEGIES:
+        value = COPING_STRATEGIES.read(key)
+        command = "coping" if key == "general" else f"coping {key}"
+        yield command, f"💪 {value['title']}", "\n".join(f"• {s}" for s in value["strategies"])
+    for key in BREATHING_EXERCISES:
+        value = BREATHING_EXERCISES.read(key)
+        yield key, f"🧘 {value['name']}", value["content"]
+    for key in MEDITATION_SCRIPTS:
+        value = MEDITATION_SCRIPTS.read(key)
+        yield key, f"🧘 {value['name']}", value["content"]
+
+
+def build_search_index() -> BM25Index:
+    """Index every resource, coping strategy, breathing exercise and meditation."""
+    index = BM25Index()
+    for doc_id, title, text in content_documents():
+        index.add(doc_id, title, text)
+    index.build()
+    return index
+
+
+SEARCH_SNIPPET_CHARS = 300
+
+
+def search_content(query: str, limit: int = 3) -> str:
+    """Search all local content and format the best-matching snippets."""
+    query = query.strip()
+    if not query:
+        return "Type **search** followed by what you're looking for, e.g. **search panic before a presentation**."
+    
+    results = get_content_index("search").search(query, limit=limit)
+    if not results:
+        return f"I couldn't find anything about \"{query}\" in the library. Try **resources** to browse topics, or just tell me what's going on. 💙"
+    
+    response = f"**🔎 Results for \"{query}\"**\n\n"
+    for result in results:
+        snippet = result.passage
+        if len(snippet) > SEARCH_SNIPPET_CHARS:
+            snippet = snippet[:SEARCH_SNIPPET_CHARS].rsplit(" ", 1)[0] + " …"
+        response += f"**{result.title}** — type **{result.doc_id}** to open\n{snippet}\n\n"
+    return response.rstrip()
+
+
+def retrieve_passages(query: str) -> list:
+    """Return library passages relevant enough to ground a reply to the query."""
+    if not RETRIEVAL_ENABLED:
+        return []
+    return [hit for hit in get_content_index("retrieval").retrieve(query, k=RETRIEVAL_TOP_K)
+            if hit.score >= RETRIEVAL_MIN_SCORE]
+
+
+# Indexes over the content library, each built the first time it is used
+# and dropped when content is reloaded
+CONTENT_INDEX_BUILDERS = {
+    "resources": build_resource_index,
+    "search": build_search_index,
+    "retrieval": lambda: PassageRetriever(content_documents()),
+}
+content_indexes = {}
+
+
+def get_content_index(name: str):
+    """Return a content index, building it on first use."""
+    index = content_indexes.get(name)
+    if index is None:
+        index = content_indexes[name] = CONTENT_INDEX_BUILDERS[name]()
+    return index
+
+
+def reload_content() -> bool:
+    """Pick up content files changed on disk; return True if anything changed."""
+    changed = [c.refresh() for c in CONTENT_COLLECTIONS]
+    if not any(changed):
+        return False
+    content_indexes.clear()
+    invalidate_render_cache()
+    return True
+
+
+def maybe_reload_content():
+    """Check for changed content at most every CONTENT_RELOAD_SECONDS."""
+    global content_checked_at
+    if CONTENT_RELOAD_SECONDS <= 0:
+        return
+    now = time.monotonic()
+    if now - content_checked_at >= CONTENT_RELOAD_SECONDS:
+        content_checked_at = now
+        reload_content()
+
+
+def format_library_context(passages: list) -> str:
+    """Format retrieved passages as compact context for the AI."""
+    excerpts = "\n\n".join(
+        f"[{hit.passage.title}]\n{hit.passage.text[:RETRIEVAL_PASSAGE_CHARS]}" for hit in passages)
+    return f"Relevant CalmSpace library excerpts (use them if helpful; don't quote them verbatim):\n\n{excerpts}"
+
+
+def get_library_answer(passages: list) -> str:
+    """Answer directly from the best library passage, without the AI."""
+    best = passages[0].passage
+    return f"""This might help — from **{best.title}**:
+
+{best.text}
+
+Type **{best.doc_id}** to read the full guide, or tell me more about what's going on. I'm here to listen. 💙"""
 
 
 def get_wellness_challenge(day: int = None) -> str:
@@ -1215,6 +1060,7 @@ def get_wellness_challenge(day: int = None) -> str:
     if session["challenge_started"] is None:
         session["challenge_started"] = datetime.now().isoformat()
         session["challenge_day"] = 1
+        save_user_session(session)
     
     if day is None:
         day = session["challenge_day"]
@@ -1276,10 +1122,16 @@ Take a few minutes to reflect on one or more of these:
 
 def get_coping_strategies(emotion: str = None) -> str:
     """Get coping strategies, optionally for a specific emotion."""
-    if emotion and emotion.lower() in COPING_STRATEGIES:
-        data = COPING_STRATEGIES[emotion.lower()]
-    else:
-        data = COPING_STRATEGIES["general"]
+    # Unknown emotions get the general list, so the cache only holds known keys
+    if emotion is not None:
+        emotion = emotion.lower() if emotion.lower() in COPING_STRATEGIES else "general"
+    return render_coping_strategies(emotion)
+
+
+@cached_render
+def render_coping_strategies(emotion: Optional[str]) -> str:
+    """Render coping strategies for a known emotion key, or the general list for None."""
+    data = COPING_STRATEGIES[emotion or "general"]
     
     response = f"**💪 {data['title']}**\n\n"
     for i, strategy in enumerate(data['strategies'], 1):
@@ -1291,6 +1143,32 @@ def get_coping_strategies(emotion: str = None) -> str:
     return response
 
 
+# Coping strategies offered for each scenario when the AI is not used
+SCENARIO_COPING = {
+    "exam_anxiety": "anxiety",
+    "future_anxiety": "anxiety",
+    "financial_stress": "anxiety",
+    "imposter_syndrome": "anxiety",
+    "loneliness": "sadness",
+    "homesickness": "sadness",
+    "depression_feelings": "sadness",
+    "relationship_issues": "sadness",
+    "burnout": "overwhelm",
+    "sleep_issues": "overwhelm",
+}
+
+RATE_LIMITED_NOTICE = "You're sending messages faster than I can answer them thoughtfully, so let's slow down together for a moment. 💙 I'll be ready to chat again in about {seconds} seconds. In the meantime, these might help:"
+
+BUSY_NOTICE = "A lot of students are reaching out right now, so I can't give you a full reply this second. 💙 Please send your message again in a minute. In the meantime, these might help (type **crisis** any time for helpline numbers):"
+
+
+def get_local_coping_reply(scenarios: list, notice: str) -> str:
+    """Reply without the AI: a notice plus coping strategies for the detected scenario."""
+    emotion = next((SCENARIO_COPING[s] for s in scenarios if s in SCENARIO_COPING), None)
+    return f"{notice}\n\n{get_coping_strategies(emotion)}"
+
+
+@cached_render
 def get_breathing_menu() -> str:
     """Return breathing exercises menu."""
     return """
@@ -1306,6 +1184,7 @@ Type the exercise name to begin.
 """
 
 
+@cached_render
 def get_meditation_menu() -> str:
     """Return meditation menu."""
     return """
@@ -1321,19 +1200,50 @@ Type the meditation name to begin.
 """
 
 
+def get_mood_insights(mood_log) -> str:
+    """Describe a session's mood trends, streaks and patterns."""
+    insights = analyze_moods(mood_log, window=MOOD_TREND_WINDOW, decline_drop=MOOD_DECLINE_DROP,
+                             low_streak_alert=MOOD_LOW_STREAK_ALERT)
+    
+    response = "**Your Mood Insights:**\n"
+    response += f"• Average: {insights.average:.1f}/5 across {insights.entries} check-ins\n"
+    if insights.previous_average is not None:
+        change = insights.recent_average - insights.previous_average
+        trend = "up from" if change >= 0.5 else "down from" if change <= -0.5 else "steady, was"
+        response += (f"• Last {MOOD_TREND_WINDOW} check-ins: {insights.recent_average:.1f}/5 "
+                     f"({trend} {insights.previous_average:.1f})\n")
+    if insights.current_streak > 1:
+        response += f"• Check-in streak: {insights.current_streak} days in a row (best: {insights.longest_streak})\n"
+    
+    # Patterns only mean something once check-ins cover several days and times
+    if insights.entries >= MOOD_PATTERN_MIN_ENTRIES:
+        weekday_means, time_means = insights.weekday_means, insights.time_of_day_means
+        if np.count_nonzero(~np.isnan(weekday_means)) >= 2:
+            response += (f"• Brightest day: {WEEKDAYS[np.nanargmax(weekday_means)]}s, "
+                         f"toughest: {WEEKDAYS[np.nanargmin(weekday_means)]}s\n")
+        if np.count_nonzero(~np.isnan(time_means)) >= 2:
+            response += f"• You tend to feel lowest in the {TIMES_OF_DAY[np.nanargmin(time_means)]}\n"
+    response += "\n"
+    
+    if insights.declining:
+        response += ("💙 Your check-ins have been lower lately. You don't have to carry that alone. "
+                     "Would you like to talk about it, or try **breathe** or **coping**? If things feel "
+                     "really heavy, type **crisis** for people you can reach right now.\n\n")
+    return response
+
+
 def get_mood_prompt() -> str:
     """Return mood tracking prompt."""
-    session = get_user_session()
+    mood_log = get_user_session()["mood_history"]
     
     response = "**📊 Mood Check-In**\n\n"
     
-    # Show recent history if exists
-    if session["mood_history"]:
+    # Show recent history and trends if exists
+    if mood_log:
         response += "**Recent Mood History:**\n"
-        recent = session["mood_history"][-5:]
-        for m in recent:
-            response += f"• {m['timestamp'][:10]}: {m['mood']} ({m['intensity']}/5)\n"
-        response += "\n"
+        for timestamp, intensity in mood_log.recent(5):
+            response += f"• {datetime.fromtimestamp(timestamp):%Y-%m-%d}: {MOOD_LABELS[str(intensity)]} ({intensity}/5)\n"
+        response += "\n" + get_mood_insights(mood_log)
     
     response += """How are you feeling right now? Rate your mood:
 
@@ -1349,39 +1259,132 @@ Type a number (1-5), or just describe how you're feeling."""
 
 
 # ============================================================================
-# CHAINLIT EVENT HANDLERS
+# COMMAND ROUTING
 # ============================================================================
 
-@cl.on_chat_start
-async def on_chat_start():
-    """Initialize the chat session."""
-    # Generate a session ID
-    cl.user_session.set("id", str(datetime.now().timestamp()))
+def handle_challenge_day(arg: str) -> Optional[str]:
+    """Show a specific challenge day, or fall through if arg is not a number."""
+    try:
+        return get_wellness_challenge(int(arg.split(" ")[0]))
+    except ValueError:
+        return None
+
+
+def handle_next_challenge(arg: str) -> str:
+    """Advance to the next challenge day."""
+    session = get_user_session()
+    session["challenge_day"] = min(session["challenge_day"] + 1, 30)
+    save_user_session(session)
+    return get_wellness_challenge()
+
+
+MOOD_LABELS = {
+    "1": "struggling",
+    "2": "not great", 
+    "3": "okay",
+    "4": "good",
+    "5": "great"
+}
+
+
+def handle_mood_rating(arg: str) -> str:
+    """Log a 1-5 mood rating and respond to it."""
+    mood = MOOD_LABELS[arg]
+    intensity = int(arg)
+    log_mood(mood, intensity)
+    
+    if intensity <= 2:
+        return f"Thank you for sharing. I've logged that you're feeling {mood}. That takes courage to acknowledge. 💙\n\nWould you like to talk about what's going on? I'm here to listen."
+    elif intensity == 3:
+        return f"Logged: Feeling {mood}. 💙\n\nSometimes 'okay' is just fine. Is there anything specific on your mind today?"
+    return f"Logged: Feeling {mood}! 💙 That's wonderful to hear.\n\nIs there anything you'd like to chat about, or would you like to try today's wellness challenge?"
+
+
+# (route, aliases, handler, record in conversation history)
+COMMAND_ROUTES = [
+    ("menu", ["menu", "help", "options", "/menu", "/help", "start"], lambda arg: get_menu(), False),
+    ("resources", ["resources", "resource", "library", "topics", "/resources"], lambda arg: get_resource_menu(), False),
+    ("challenge", ["challenge", "wellness", "daily", "/challenge"], lambda arg: get_wellness_challenge(), False),
+    ("next_challenge", ["next challenge", "next", "tomorrow"], handle_next_challenge, False),
+    ("journal", ["journal", "journal prompts", "prompts", "/journal"], lambda arg: get_journal_prompts(), False),
+    ("breathe", ["breathe", "breathing", "breath", "/breathe"], lambda arg: get_breathing_menu(), False),
+    ("breathe_box", ["box", "box breathing"], lambda arg: BREATHING_EXERCISES["box"]["content"], False),
+    ("breathe_478", ["478", "4-7-8", "4 7 8"], lambda arg: BREATHING_EXERCISES["478"]["content"], False),
+    ("breathe_grounding", ["grounding", "5-4-3-2-1", "54321", "ground"], lambda arg: BREATHING_EXERCISES["grounding"]["content"], False),
+    ("meditate", ["meditate", "meditation", "/meditate"], lambda arg: get_meditation_menu(), False),
+    ("meditate_calm", ["calm", "2 minute calm", "2-minute calm", "quick calm"], lambda arg: MEDITATION_SCRIPTS["calm"]["content"], False),
+    ("meditate_body_scan", ["body scan", "bodyscan", "body"], lambda arg: MEDITATION_SCRIPTS["body scan"]["content"], False),
+    ("meditate_self_compassion", ["self compassion", "self-compassion", "compassion"], lambda arg: MEDITATION_SCRIPTS["self compassion"]["content"], False),
+    ("coping", ["coping", "cope", "strategies", "/coping"], lambda arg: get_coping_strategies(), False),
+    ("crisis", ["crisis", "emergency", "help now", "/crisis", "helpline", "helplines"], lambda arg: CRISIS_RESOURCES, False),
+    ("mood", ["mood", "track mood", "how am i", "/mood", "mood check"], lambda arg: get_mood_prompt(), False),
+    ("search", ["search", "/search"], lambda arg: search_content(""), False),
+    ("mood_rating", list(MOOD_LABELS), handle_mood_rating, True),
+]
+
+# (route, prefix, handler, record); handlers get the text after the prefix
+# and return None to fall through to resources and AI chat
+PREFIX_ROUTES = [
+    ("challenge_day", "challenge ", handle_challenge_day, False),
+    ("coping_emotion", "coping ", lambda arg: get_coping_strategies(arg.strip()), False),
+    ("search", "search ", search_content, False),
+]
+
+# Every alias maps straight to its route, so matching is one hash lookup
+COMMAND_TABLE = {
+    alias: (route, handler, record)
+    for route, aliases, handler, record in COMMAND_ROUTES
+    for alias in aliases
+}
+
+def record_route(route: str, started: float):
+    """Record a handled message in its route's histogram and the event log."""
+    elapsed = time.perf_counter() - started
+    metrics.observe("message_seconds", elapsed, route=route)
+    event_log.message(
+        session=event_log.session_hash(get_session_id()),
+        route=route,
+        latency_ms=round(elapsed * 1000, 2),
+        **(message_event.get() or {})
+    )
+
+
+async def send_message(content: str):
+    """Send a reply, timing it as the 'send' stage."""
+    with metrics.span("send"):
+        await cl.Message(content=content).send()
+
+
+def dispatch_command(user_msg_lower: str):
+    """Run the command matching the message; return (route, response, record) or None."""
+    command = COMMAND_TABLE.get(user_msg_lower)
+    if command:
+        route, handler, record = command
+        return route, handler(user_msg_lower), record
+    
+    for route, prefix, handler, record in PREFIX_ROUTES:
+        if user_msg_lower.startswith(prefix):
+            response = handler(user_msg_lower[len(prefix):])
+            if response is not None:
+                return route, response, record
     
-    welcome_message = """
-**🌿 Welcome to CalmSpace**
+    return None
 
-I'm here to support you through whatever you're experiencing—stress, anxiety, loneliness, exam pressure, or just needing someone to talk to.
 
-**This is a safe, judgment-free space.** 💙
+warm_render_cache()
 
-**Commands you can use:**
-• **menu** — See all options
-• **mood** — Track your mood
-• **challenge** — Daily wellness challenge
-• **resources** — Browse mental health topics
-• **breathe** — Breathing exercises
-• **meditate** — Quick meditations
-• **journal** — Journal prompts
-• **coping** — Coping strategies
-• **crisis** — Crisis helplines
 
-Or just tell me how you're feeling. **How are you doing today?**
+# ============================================================================
+# CHAINLIT EVENT HANDLERS
+# ============================================================================
 
-*Note: I'm an AI companion, not a replacement for professional help. If you're in crisis, type 'crisis' for immediate resources.*
-"""
+@cl.on_chat_start
+async def on_chat_start():
+    """Initialize the chat session."""
+    # Generate a session ID
+    cl.user_session.set("id", str(datetime.now().timestamp()))
     
-    await cl.Message(content=welcome_message).send()
+    await cl.Message(content=get_welcome_message()).send()
 
 
 @cl.on_message
@@ -1389,165 +1392,175 @@ async def on_message(message: cl.Message):
     """Handle incoming messages."""
     user_msg = message.content.strip()
     user_msg_lower = user_msg.lower()
+    started = time.perf_counter()
+    message_event.set({"message": user_msg})
+    maybe_reload_content()
     
     # Add to conversation history
     add_to_conversation("user", user_msg)
     
     # ===== CRISIS CHECK (ALWAYS FIRST) =====
-    if check_crisis(user_msg):
-        crisis_response = f"""
-I hear that you're going through something really difficult right now, and I'm genuinely concerned about you. 💙
-
-What you're feeling is real, and you deserve support.
-
-{CRISIS_RESOURCES}
-
-I'm here if you want to talk, but please also reach out to one of these resources. You don't have to go through this alone.
-"""
-        await cl.Message(content=crisis_response).send()
+    with metrics.span("crisis_check"):
+        is_crisis = check_crisis(user_msg)
+    if is_crisis:
+        crisis_response = get_crisis_response()
+        await send_message(crisis_response)
         add_to_conversation("assistant", crisis_response)
+        record_route("crisis_detected", started)
         return
     
     # ===== COMMAND HANDLING =====
-    
-    # Menu
-    if user_msg_lower in ["menu", "help", "options", "/menu", "/help", "start"]:
-        await cl.Message(content=get_menu()).send()
-        return
-    
-    # Resources
-    if user_msg_lower in ["resources", "resource", "library", "topics", "/resources"]:
-        await cl.Message(content=get_resource_menu()).send()
-        return
-    
-    # Challenge
-    if user_msg_lower in ["challenge", "wellness", "daily", "/challenge"]:
-        response = get_wellness_challenge()
-        await cl.Message(content=response).send()
-        return
-    
-    # Challenge with day number
-    if user_msg_lower.startswith("challenge "):
-        try:
-            day = int(user_msg_lower.split(" ")[1])
-            response = get_wellness_challenge(day)
-            await cl.Message(content=response).send()
-            return
-        except:
-            pass
-    
-    # Next challenge
-    if user_msg_lower in ["next challenge", "next", "tomorrow"]:
-        session = get_user_session()
-        session["challenge_day"] = min(session["challenge_day"] + 1, 30)
-        response = get_wellness_challenge()
-        await cl.Message(content=response).send()
+    with metrics.span("command_match"):
+        command = dispatch_command(user_msg_lower)
+    if command:
+        route, response, record = command
+        await send_message(response)
+        if record:
+            add_to_conversation("assistant", response)
+        record_route(route, started)
         return
     
-    # Journal
-    if user_msg_lower in ["journal", "journal prompts", "prompts", "/journal"]:
-        response = get_journal_prompts()
-        await cl.Message(content=response).send()
-        return
-    
-    # Breathe menu
-    if user_msg_lower in ["breathe", "breathing", "breath", "/breathe"]:
-        await cl.Message(content=get_breathing_menu()).send()
-        return
-    
-    # Specific breathing exercises
-    if user_msg_lower in ["box", "box breathing"]:
-        await cl.Message(content=BREATHING_EXERCISES["box"]["content"]).send()
-        return
-    
-    if user_msg_lower in ["478", "4-7-8", "4 7 8"]:
-        await cl.Message(content=BREATHING_EXERCISES["478"]["content"]).send()
-        return
-    
-    if user_msg_lower in ["grounding", "5-4-3-2-1", "54321", "ground"]:
-        await cl.Message(content=BREATHING_EXERCISES["grounding"]["content"]).send()
-        return
-    
-    # Meditate menu
-    if user_msg_lower in ["meditate", "meditation", "/meditate"]:
-        await cl.Message(content=get_meditation_menu()).send()
-        return
-    
-    # Specific meditations
-    if user_msg_lower in ["calm", "2 minute calm", "2-minute calm", "quick calm"]:
-        await cl.Message(content=MEDITATION_SCRIPTS["calm"]["content"]).send()
-        return
-    
-    if user_msg_lower in ["body scan", "bodyscan", "body"]:
-        await cl.Message(content=MEDITATION_SCRIPTS["body scan"]["content"]).send()
-        return
-    
-    if user_msg_lower in ["self compassion", "self-compassion", "compassion"]:
-        await cl.Message(content=MEDITATION_SCRIPTS["self compassion"]["content"]).send()
-        return
-    
-    # Coping strategies
-    if user_msg_lower in ["coping", "cope", "strategies", "/coping"]:
-        await cl.Message(content=get_coping_strategies()).send()
+    # Check if it's a resource request (by number or name)
+    with metrics.span("resource_lookup"):
+        resource = get_resource(user_msg)
+    if resource:
+        await send_message(resource)
+        record_route("resource", started)
         return
     
-    # Emotion-specific coping
-    if user_msg_lower.startswith("coping "):
-        emotion = user_msg_lower.replace("coping ", "").strip()
-        await cl.Message(content=get_coping_strategies(emotion)).send()
-        return
+    # ===== AI RESPONSE FOR GENERAL CHAT =====
     
-    # Crisis
-    if user_msg_lower in ["crisis", "emergency", "help now", "/crisis", "helpline", "helplines"]:
-        await cl.Message(content=CRISIS_RESOURCES).send()
+    # Detect scenarios for context-aware response
+    with metrics.span("scenario_detection"):
+        scenarios = select_scenarios(user_msg)
+    note_event(scenarios=scenarios)
+    
+    # Ground the reply in library content; a confident match is answered locally
+    with metrics.span("retrieval"):
+        passages = retrieve_passages(user_msg)
+    if passages:
+        note_event(retrieval_score=round(passages[0].score, 3))
+    if passages and passages[0].score >= RETRIEVAL_DIRECT_SCORE:
+        response = get_library_answer(passages)
+        await send_message(response)
+        add_to_conversation("assistant", response)
+        record_route("library_answer", started)
         return
     
-    # Mood tracking
-    if user_msg_lower in ["mood", "track mood", "how am i", "/mood", "mood check"]:
-        await cl.Message(content=get_mood_prompt()).send()
+    # ===== ADMISSION CONTROL (crisis messages never reach this point) =====
+    session_id = get_session_id()
+    if not chat_rate_limiter.allow(session_id):
+        response = get_local_coping_reply(
+            scenarios, RATE_LIMITED_NOTICE.format(seconds=round(chat_rate_limiter.retry_after(session_id))))
+        await send_message(response)
+        add_to_conversation("assistant", response)
+        record_route("rate_limited", started)
         return
     
-    # Mood rating (1-5)
-    if user_msg_lower in ["1", "2", "3", "4", "5"]:
-        mood_labels = {
-            "1": "struggling",
-            "2": "not great", 
-            "3": "okay",
-            "4": "good",
-            "5": "great"
-        }
-        mood = mood_labels[user_msg_lower]
-        intensity = int(user_msg_lower)
-        log_mood(mood, intensity)
-        
-        if intensity <= 2:
-            response = f"Thank you for sharing. I've logged that you're feeling {mood}. That takes courage to acknowledge. 💙\n\nWould you like to talk about what's going on? I'm here to listen."
-        elif intensity == 3:
-            response = f"Logged: Feeling {mood}. 💙\n\nSometimes 'okay' is just fine. Is there anything specific on your mind today?"
+    # Get AI response, streaming tokens as they arrive when enabled
+    # (requests that join an identical one already in flight skip the queue)
+    try:
+        if STREAM_RESPONSES:
+            response = await stream_ai_response(user_msg, scenarios, cl.Message(content=""), passages)
         else:
-            response = f"Logged: Feeling {mood}! 💙 That's wonderful to hear.\n\nIs there anything you'd like to chat about, or would you like to try today's wellness challenge?"
-        
-        await cl.Message(content=response).send()
+            response = await get_ai_response(user_msg, scenarios, passages)
+            await send_message(response)
+    except AdmissionRejected:
+        response = get_local_coping_reply(scenarios, BUSY_NOTICE)
+        await send_message(response)
         add_to_conversation("assistant", response)
+        record_route("ai_busy", started)
         return
     
-    # Check if it's a resource request (by number or name)
-    resource = get_resource(user_msg)
-    if resource:
-        await cl.Message(content=resource).send()
-        return
-    
-    # ===== AI RESPONSE FOR GENERAL CHAT =====
-    
-    # Detect scenario for context-aware response
-    scenario = detect_scenario(user_msg)
-    
-    # Get AI response
-    response = await get_ai_response(user_msg, scenario)
-    
     add_to_conversation("assistant", response)
-    
-    await cl.Message(content=response).send()
+    record_route("ai", started)
+    schedule_summary_update()
+
+
+# ============================================================================
+# METRICS ENDPOINTS
+# ============================================================================
+
+async def metrics_endpoint():
+    """Serve latency histograms in the Prometheus text format."""
+    from fastapi.responses import PlainTextResponse
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+# Cross-session mood report, the time it was computed and any refresh in progress
+mood_report = {"computed_at": None, "report": None, "refresh": None}
+
+
+def compute_mood_report() -> dict:
+    """Aggregate moods across all sessions; runs in a worker thread."""
+    report = aggregate_moods(*session_backend.mood_arrays(), window=MOOD_TREND_WINDOW,
+                             decline_drop=MOOD_DECLINE_DROP, low_streak_alert=MOOD_LOW_STREAK_ALERT)
+    if report["sessions"] < MOOD_REPORT_MIN_SESSIONS:
+        return {"sessions": report["sessions"], "withheld": True,
+                "min_sessions": MOOD_REPORT_MIN_SESSIONS}
+    return report
+
+
+async def refresh_mood_report():
+    """Recompute the mood report in a worker thread."""
+    with metrics.span("mood_report"):
+        mood_report["report"] = await asyncio.to_thread(compute_mood_report)
+    mood_report["computed_at"] = time.monotonic()
+
+
+async def get_mood_report() -> dict:
+    """
+    Return the cross-session mood report, recomputing it off the event loop
+    at most every MOOD_REPORT_MAX_AGE seconds; concurrent requests share
+    one refresh.
+    """
+    computed_at = mood_report["computed_at"]
+    if computed_at is None or time.monotonic() - computed_at > MOOD_REPORT_MAX_AGE:
+        if mood_report["refresh"] is None:
+            mood_report["refresh"] = asyncio.ensure_future(refresh_mood_report())
+            mood_report["refresh"].add_done_callback(lambda _: mood_report.update(refresh=None))
+        await asyncio.shield(mood_report["refresh"])
+    return mood_report["report"]
+
+
+async def mood_report_endpoint():
+    """Serve the cross-session mood report as JSON."""
+    return await get_mood_report()
+
+
+async def metrics_json_endpoint():
+    """Serve p50/p95/p99 latency summaries per route and stage as JSON."""
+    snapshot = metrics.snapshot()
+    snapshot["llm"] = llm_caller.stats()
+    snapshot["llm_endpoints"] = llm_router.stats()
+    snapshot["chat_rate_limiter"] = chat_rate_limiter.stats()
+    snapshot["ai_admission"] = ai_admission.stats()
+    snapshot["coalescing"] = single_flight.stats()
+    snapshot["sessions"] = session_backend.stats()
+    if response_cache is not None:
+        snapshot["response_cache"] = response_cache.stats()
+    return snapshot
+
+
+def mount_routes(routes: Dict[str, Callable]):
+    """Add GET endpoints by path to the Chainlit server."""
+    from chainlit.server import app
+    
+    existing = app.router.routes
+    added_from = len(existing)
+    for path, endpoint in routes.items():
+        app.add_api_route(path, endpoint, methods=["GET"], include_in_schema=False)
+    # Chainlit serves its frontend from a catch-all route; ours must come first
+    added = existing[added_from:]
+    del existing[added_from:]
+    existing[0:0] = added
+
+
+if METRICS_ENDPOINT_ENABLED:
+    mount_routes({"/metrics": metrics_endpoint, "/metrics.json": metrics_json_endpoint})
+
+if MOOD_REPORT_ENDPOINT_ENABLED:
+    mount_routes({"/reports/moods.json": mood_report_endpoint})
 
 
 # ============================================================================
@@ -0,0 +1,131 @@
+"""
+CalmSpace - Metrics
+===================
+Latency histograms for the message pipeline.
+
+Histograms use fixed buckets, so memory stays constant however many
+messages are handled. Percentiles (p50/p95/p99) are estimated from the
+buckets the same way Prometheus' histogram_quantile does. The registry
+renders both the Prometheus text format and a JSON snapshot.
+"""
+
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+# Upper bounds in seconds, from sub-millisecond command handling up to
+# slow LLM completions
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _label_value(value) -> str:
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile by interpolating within its bucket."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower  # +Inf bucket: best estimate is its lower bound
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """Named, labelled histograms with Prometheus and JSON export."""
+
+    def __init__(self, prefix: str = "calmspace"):
+        self.prefix = prefix
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._help: Dict[str, str] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+
+    def describe(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """Set a metric's help text and the buckets its histograms use."""
+        self._help[name] = help_text
+        self._buckets[name] = tuple(buckets)
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, tuple(sorted((label, _label_value(value)) for label, value in labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(self._buckets.get(name, DEFAULT_BUCKETS))
+        return histogram
+
+    def observe(self, name: str, value: float, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    @contextmanager
+    def span(self, stage: str, name: str = "stage_seconds"):
+        """Time a block of code into the histogram for ``stage``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, stage=stage)
+
+    def snapshot(self) -> dict:
+        """Return every histogram summary, grouped by metric name."""
+        result: Dict[str, list] = {}
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            result.setdefault(name, []).append({"labels": dict(labels), **histogram.summary()})
+        return result
+
+    def render_prometheus(self) -> str:
+        """Render all histograms in the Prometheus text exposition format."""
+        lines = []
+        described = set()
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            metric = f"{self.prefix}_{name}"
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {metric} {self._help[name]}")
+                lines.append(f"# TYPE {metric} histogram")
+            label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+            prefix = f"{label_text}," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{metric}_sum{suffix} {histogram.sum}")
+            lines.append(f"{metric}_count{suffix} {histogram.count}")
+        return "\n".join(lines) + "\n"
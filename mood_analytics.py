@@ -0,0 +1,265 @@
+"""
+CalmSpace - Mood Analytics
+==========================
+Compact per-session mood storage and vectorised trend insights.
+
+Each session's check-ins live in a MoodLog: two growable NumPy arrays of
+epoch timestamps and 1-5 ratings, rather than a list of dicts. Insights
+for one session (rolling average, check-in streaks, weekday and
+time-of-day patterns, decline alerts) are array operations over that log.
+Analytics across all sessions run as one batched pass over the
+concatenated logs, grouped by session index with bincount, so thousands
+of sessions take milliseconds.
+"""
+
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+DAY_SECONDS = 86400
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Six-hour parts of the day, starting at midnight
+TIMES_OF_DAY = ["night", "morning", "afternoon", "evening"]
+
+# Ratings at or below this count as a low mood
+LOW_MOOD = 2
+
+
+class MoodLog:
+    """Append-only mood check-ins for one session, stored in growable arrays."""
+    __slots__ = ("_timestamps", "_intensities", "_size")
+
+    def __init__(self, capacity: int = 8):
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        self._intensities = np.empty(capacity, dtype=np.int8)
+        self._size = 0
+
+    @classmethod
+    def from_entries(cls, intensities: Iterable[int], timestamps: Iterable[float]) -> "MoodLog":
+        """Build a log from ratings and epoch timestamps in logging order."""
+        intensities = np.fromiter(intensities, dtype=np.int8)
+        log = cls(capacity=max(8, len(intensities)))
+        log._intensities[:len(intensities)] = intensities
+        log._timestamps[:len(intensities)] = np.fromiter(timestamps, dtype=np.float64,
+                                                          count=len(intensities))
+        log._size = len(intensities)
+        return log
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __repr__(self) -> str:
+        return f"MoodLog({self._size} entries)"
+
+    def append(self, intensity: int, timestamp: float):
+        """Add a check-in, doubling the arrays when they are full."""
+        if self._size == len(self._timestamps):
+            capacity = max(8, 2 * self._size)
+            self._timestamps = np.resize(self._timestamps, capacity)
+            self._intensities = np.resize(self._intensities, capacity)
+        self._timestamps[self._size] = timestamp
+        self._intensities[self._size] = intensity
+        self._size += 1
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[:self._size]
+
+    @property
+    def intensities(self) -> np.ndarray:
+        return self._intensities[:self._size]
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Copy (timestamps, intensities) of the same check-ins; safe to call
+        from another thread while the session keeps logging.
+        """
+        size = self._size
+        return self._timestamps[:size].copy(), self._intensities[:size].copy()
+
+    def recent(self, count: int) -> List[Tuple[float, int]]:
+        """Return the last ``count`` (timestamp, rating) pairs, oldest first."""
+        start = max(0, self._size - count)
+        return list(zip(self.timestamps[start:].tolist(), self.intensities[start:].tolist()))
+
+
+def local_utc_offset() -> float:
+    """Seconds the server's local time is ahead of UTC."""
+    return datetime.now().astimezone().utcoffset().total_seconds()
+
+
+def local_days(timestamps: np.ndarray, utc_offset: float) -> np.ndarray:
+    """Day numbers (days since 1970-01-01, local time) of epoch timestamps."""
+    return np.floor_divide(timestamps + utc_offset, DAY_SECONDS).astype(np.int64)
+
+
+def weekdays(days: np.ndarray) -> np.ndarray:
+    """Weekday indexes (Monday = 0) of day numbers; 1970-01-01 was a Thursday."""
+    return (days + 3) % 7
+
+
+def times_of_day(timestamps: np.ndarray, utc_offset: float) -> np.ndarray:
+    """Indexes into TIMES_OF_DAY of epoch timestamps."""
+    seconds = np.mod(timestamps + utc_offset, DAY_SECONDS)
+    return (seconds // (DAY_SECONDS / len(TIMES_OF_DAY))).astype(np.int64)
+
+
+def group_means(groups: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """Mean of ``values`` per group index, NaN for groups without values."""
+    counts = np.bincount(groups, minlength=size)
+    sums = np.bincount(groups, weights=values, minlength=size)
+    return np.divide(sums, counts, out=np.full(size, np.nan), where=counts > 0)
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean of each value and up to ``window - 1`` values before it."""
+    sums = np.cumsum(values, dtype=np.float64)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums / np.minimum(np.arange(1, len(values) + 1), window)
+
+
+def day_streaks(days: np.ndarray, today: int) -> Tuple[int, int]:
+    """
+    Return (current, longest) runs of consecutive days with a check-in;
+    the current run still counts if the last check-in was yesterday.
+    """
+    unique = np.unique(days)
+    if not len(unique):
+        return 0, 0
+    breaks = np.flatnonzero(np.diff(unique) != 1)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [len(unique) - 1]))
+    lengths = ends - starts + 1
+    current = int(lengths[-1]) if unique[-1] >= today - 1 else 0
+    return current, int(lengths.max())
+
+
+def trailing_run(mask: np.ndarray) -> int:
+    """Length of the run of True values at the end of ``mask``."""
+    falses = np.flatnonzero(~mask)
+    return len(mask) - 1 - int(falses[-1]) if len(falses) else len(mask)
+
+
+class MoodInsights(NamedTuple):
+    """Trend summary for one session's check-ins."""
+    entries: int
+    average: float
+    recent_average: float
+    previous_average: Optional[float]
+    current_streak: int
+    longest_streak: int
+    low_streak: int
+    weekday_means: np.ndarray
+    time_of_day_means: np.ndarray
+    declining: bool
+
+
+def analyze(log: MoodLog, window: int = 3, decline_drop: float = 1.0, low_streak_alert: int = 3,
+            now: Optional[float] = None, utc_offset: Optional[float] = None) -> Optional[MoodInsights]:
+    """
+    Summarise a session's moods, or return None without check-ins.
+
+    ``window``: check-ins in the recent rolling average, compared with the
+    ``window`` before it. The session is flagged as declining when that
+    average drops by ``decline_drop`` or more, or when the last
+    ``low_streak_alert`` check-ins were all low.
+    """
+    if not len(log):
+        return None
+    utc_offset = local_utc_offset() if utc_offset is None else utc_offset
+    now = datetime.now().timestamp() if now is None else now
+    values = log.intensities.astype(np.float64)
+    days = local_days(log.timestamps, utc_offset)
+
+    rolling = rolling_mean(values, window)
+    recent_average = float(rolling[-1])
+    previous_average = float(rolling[-1 - window]) if len(values) >= 2 * window else None
+    low_streak = trailing_run(values <= LOW_MOOD)
+    current_streak, longest_streak = day_streaks(
+        days, int(local_days(np.array([now]), utc_offset)[0]))
+    declining = low_streak >= low_streak_alert or (
+        previous_average is not None and previous_average - recent_average >= decline_drop)
+
+    return MoodInsights(
+        entries=len(values),
+        average=float(values.mean()),
+        recent_average=recent_average,
+        previous_average=previous_average,
+        current_streak=current_streak,
+        longest_streak=longest_streak,
+        low_streak=low_streak,
+        weekday_means=group_means(weekdays(days), values, len(WEEKDAYS)),
+        time_of_day_means=group_means(times_of_day(log.timestamps, utc_offset), values,
+                                      len(TIMES_OF_DAY)),
+        declining=declining,
+    )
+
+
+# ============================================================================
+# CROSS-SESSION ANALYTICS
+# ============================================================================
+
+def stack_logs(logs: Iterable[MoodLog]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Concatenate logs into (session index, timestamps, intensities) arrays."""
+    snapshots = [snapshot for snapshot in (log.snapshot() for log in logs) if len(snapshot[0])]
+    if not snapshots:
+        return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64),
+                np.zeros(0, dtype=np.int8))
+    lengths = [len(timestamps) for timestamps, _ in snapshots]
+    return (np.repeat(np.arange(len(snapshots)), lengths),
+            np.concatenate([timestamps for timestamps, _ in snapshots]),
+            np.concatenate([intensities for _, intensities in snapshots]))
+
+
+def _nullable(values: np.ndarray) -> list:
+    """Array to a JSON-safe list, with NaN as None."""
+    return [None if np.isnan(value) else round(float(value), 3) for value in values]
+
+
+def aggregate(sessions: np.ndarray, timestamps: np.ndarray, intensities: np.ndarray,
+              window: int = 3, decline_drop: float = 1.0, low_streak_alert: int = 3,
+              utc_offset: Optional[float] = None) -> dict:
+    """
+    Summarise moods across sessions in one vectorised pass.
+
+    Inputs are parallel arrays with rows grouped by session index
+    (0..n-1) and in logging order within each session, as returned by
+    stack_logs(). Decline alerts follow the same rules as analyze().
+    """
+    if not len(intensities):
+        return {"sessions": 0, "entries": 0}
+    utc_offset = local_utc_offset() if utc_offset is None else utc_offset
+    values = intensities.astype(np.float64)
+    counts = np.bincount(sessions)
+    active = counts > 0
+
+    # Position of every row counted back from its session's latest check-in
+    starts = np.cumsum(counts) - counts
+    from_end = counts[sessions] - 1 - (np.arange(len(values)) - starts[sessions])
+    recent = from_end < window
+    previous = (from_end >= window) & (from_end < 2 * window)
+    recent_average = group_means(sessions[recent], values[recent], len(counts))
+    previous_average = group_means(sessions[previous], values[previous], len(counts))
+    dropped = (counts >= 2 * window) & (previous_average - recent_average >= decline_drop)
+    last_low = np.bincount(sessions, weights=(from_end < low_streak_alert) & (values <= LOW_MOOD),
+                           minlength=len(counts))
+    declining = dropped | ((counts >= low_streak_alert) & (last_low >= low_streak_alert))
+
+    days = local_days(timestamps, utc_offset)
+    session_count = int(active.sum())
+    return {
+        "sessions": session_count,
+        "entries": len(values),
+        "average": round(float(values.mean()), 3),
+        "session_average": round(float(group_means(sessions, values, len(counts))[active].mean()), 3),
+        "distribution": (np.bincount(intensities, minlength=6)[1:6] / len(values)).round(3).tolist(),
+        "weekday_averages": dict(zip(WEEKDAYS, _nullable(
+            group_means(weekdays(days), values, len(WEEKDAYS))))),
+        "time_of_day_averages": dict(zip(TIMES_OF_DAY, _nullable(
+            group_means(times_of_day(timestamps, utc_offset), values, len(TIMES_OF_DAY))))),
+        "declining_sessions": int(declining.sum()),
+        "declining_share": round(float(declining.sum()) / session_count, 3),
+    }
@@ -0,0 +1,107 @@
+"""
+CalmSpace - Rate Limiter
+========================
+Per-session token buckets and global admission control for AI chat.
+
+Each session has a token bucket: a burst of messages is allowed, then
+they refill at a steady rate. Buckets live in a SessionStore whose idle
+TTL is the time a bucket takes to refill completely, so an expired bucket
+is exactly equivalent to a fresh one.
+
+AdmissionController caps the AI replies generated at once. Extra requests
+wait in a bounded queue for a limited time, then are turned away so the
+caller can answer locally instead of piling up.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Callable
+
+from session_store import SessionStore
+
+
+class SessionRateLimiter:
+    """Token bucket per session: ``burst`` messages, refilled at ``rate_per_minute``."""
+
+    def __init__(self, rate_per_minute: float = 6, burst: int = 5, max_sessions: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._clock = clock
+        self._buckets = SessionStore(max_entries=max_sessions, ttl_seconds=burst / self.rate, clock=clock)
+        self.allowed = 0
+        self.limited = 0
+
+    def _bucket(self, session_id: str) -> dict:
+        bucket = self._buckets.get_or_create(
+            session_id, lambda: {"tokens": float(self.burst), "updated": self._clock()})
+        now = self._clock()
+        bucket["tokens"] = min(self.burst, bucket["tokens"] + (now - bucket["updated"]) * self.rate)
+        bucket["updated"] = now
+        return bucket
+
+    def allow(self, session_id: str) -> bool:
+        """Take a token for one message; return False if the session is over its limit."""
+        bucket = self._bucket(session_id)
+        if bucket["tokens"] < 1:
+            self.limited += 1
+            return False
+        bucket["tokens"] -= 1
+        self.allowed += 1
+        return True
+
+    def retry_after(self, session_id: str) -> float:
+        """Return the seconds until the session's next message is allowed."""
+        return max(0.0, (1 - self._bucket(session_id)["tokens"]) / self.rate)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._buckets), "allowed": self.allowed, "limited": self.limited}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted in time."""
+
+
+class AdmissionController:
+    """Cap concurrent work, queueing extra requests for at most ``max_wait_seconds``."""
+
+    def __init__(self, max_in_flight: int = 16, max_queue: int = 100, max_wait_seconds: float = 5):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold one slot for the duration of the block; raise AdmissionRejected if none frees up."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("Admission queue is full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait_seconds)
+        except TimeoutError:
+            self.rejected += 1
+            raise AdmissionRejected("Timed out waiting for admission") from None
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,207 @@
+"""
+CalmSpace - Resilience
+======================
+Deadlines, retries and a circuit breaker around LLM calls.
+
+Every call gets an overall deadline. Transient failures (rate limits,
+timeouts, connection errors and 5xx responses) are retried with full
+jitter backoff for as long as the deadline allows; anything else fails
+straight away. A circuit breaker counts failed attempts and, once
+upstream looks unhealthy, rejects calls immediately so replies fall back
+to local content instead of waiting on a dead API.
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying besides 5xx
+RETRYABLE_STATUSES = frozenset({408, 409, 429})
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit is open."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Return True for errors a later attempt may not hit."""
+    if isinstance(exc, (TimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status is not None and (status >= 500 or status in RETRYABLE_STATUSES)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Return the server's Retry-After delay in seconds, if it sent one."""
+    response = getattr(exc, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after ``failure_threshold`` consecutive failures; open
+    -> half-open after ``reset_seconds``, when a single trial call decides
+    whether to close again or stay open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Return True if a call may go upstream now."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def release(self):
+        """Give up an allowed call without an outcome (e.g. it was cancelled), freeing a half-open trial."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self._state = self.CLOSED
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.opened += 1
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+
+class ResilientCaller:
+    """Run an async call under a deadline, with jittered retries and a circuit breaker."""
+
+    def __init__(self, deadline_seconds: float = 20, attempt_timeout: Optional[float] = 10,
+                 max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 4.0,
+                 breaker: Optional[CircuitBreaker] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 rng: Callable[[float, float], float] = random.uniform):
+        """
+        ``deadline_seconds``: total time for all attempts and backoff.
+        ``attempt_timeout``: cap on a single attempt (also bounded by the
+        time left); None when ``func`` enforces its own, e.g. per endpoint. ``base_delay``/``max_delay``: backoff before retry n
+        (from 1) is uniform in [0, min(max_delay, base_delay * 2**(n-1))],
+        unless the server sent Retry-After.
+        """
+        self.deadline_seconds = deadline_seconds
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._clock = clock
+        self._rng = rng
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def deadline(self) -> float:
+        """Return the clock time by which a call starting now must finish."""
+        return self._clock() + self.deadline_seconds
+
+    def remaining(self, deadline: float) -> float:
+        """Return the seconds left before ``deadline``."""
+        return max(0.0, deadline - self._clock())
+
+    async def call(self, func: Callable[[], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        """
+        Await ``func()`` until it succeeds, fails permanently or runs out
+        of attempts or time; raise CircuitOpenError without calling it if
+        the breaker is open.
+        """
+        self.calls += 1
+        deadline = deadline if deadline is not None else self.deadline()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM circuit breaker is open")
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                self.failures += 1
+                raise TimeoutError("LLM deadline exceeded")
+            timeout = remaining if self.attempt_timeout is None else min(self.attempt_timeout, remaining)
+            try:
+                result = await asyncio.wait_for(func(), timeout=timeout)
+            except asyncio.CancelledError:
+                self.breaker.release()  # the caller went away; this says nothing about upstream
+                raise
+            except CircuitOpenError:
+                # Every endpoint's own circuit is open: nothing reached
+                # upstream, so this is neither a success nor a new failure
+                self.breaker.release()
+                self.failures += 1
+                raise
+            except Exception as e:
+                if isinstance(e, TimeoutError):
+                    self.timeouts += 1
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()  # upstream answered; the request was at fault
+                attempt += 1
+                if not retryable or attempt >= self.max_attempts:
+                    self.failures += 1
+                    raise
+                delay = retry_after(e)
+                if delay is None:
+                    delay = self._rng(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if self._clock() + delay >= deadline:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> dict:
+        """Return call, retry and breaker counters."""
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.opened,
+            "circuit_rejected": self.breaker.rejected,
+        }
@@ -0,0 +1,94 @@
+"""
+CalmSpace - Response Cache
+==========================
+TTL + LRU cache for AI replies to repeated prompts.
+
+Only prompts with little or no conversation history are worth caching:
+many students open with near-identical messages. Keys hash the full
+effective prompt (system prompts, scenario context, any history and the
+normalised message), so a cached reply is only reused for an identical
+request.
+"""
+
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+PUNCTUATION = re.compile(r"[^\w\s']+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Lower-case a message and strip punctuation and extra whitespace."""
+    message = message.lower().replace("’", "'")
+    return WHITESPACE.sub(" ", PUNCTUATION.sub(" ", message)).strip()
+
+
+def prompt_key(messages: Iterable[dict], user_message: str) -> str:
+    """Hash the prompt context plus the normalised user message."""
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(message["role"].encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(message["content"].encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(normalize_message(user_message).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """LRU cache whose entries expire ``ttl_seconds`` after being stored."""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, response)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached response and mark it recently used, or None."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, response: str):
+        """Store a response, evicting the least recently used entries if full."""
+        self._entries[key] = (self._clock() + self.ttl_seconds, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every cached response."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return size, hit/miss and eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,114 @@
+"""
+CalmSpace - Local Retrieval
+===========================
+Offline passage retrieval over the content library with NumPy.
+
+Passages are embedded once at startup as TF-IDF vectors over the library
+vocabulary and stored as one L2-normalised float32 matrix. A query is
+embedded the same way and scored against every passage with a single
+matrix-vector product, so no model download or network call is needed.
+"""
+
+from typing import Iterable, List, NamedTuple, Tuple
+
+import numpy as np
+
+from search_index import content_terms, split_passages
+
+
+class Passage(NamedTuple):
+    """A retrievable chunk of library content."""
+    doc_id: str
+    title: str
+    text: str
+
+
+class RetrievedPassage(NamedTuple):
+    """A passage with its cosine similarity to the query."""
+    passage: Passage
+    score: float
+
+
+class LexicalEmbedder:
+    """
+    TF-IDF embeddings over the library vocabulary.
+
+    Each dimension is one library term, so there are no hash collisions.
+    Query terms outside the vocabulary map to their longest in-vocabulary
+    prefix ('panicking' -> 'panic') or are ignored.
+    """
+
+    def __init__(self, min_prefix: int = 4):
+        self.min_prefix = min_prefix
+        self.vocabulary = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+
+    def _resolve(self, term: str):
+        if term in self.vocabulary:
+            return self.vocabulary[term]
+        for length in range(len(term) - 1, self.min_prefix - 1, -1):
+            if term[:length] in self.vocabulary:
+                return self.vocabulary[term[:length]]
+        return None
+
+    def _counts(self, terms: List[str]) -> np.ndarray:
+        counts = np.zeros(len(self.vocabulary), dtype=np.float32)
+        columns = [column for column in map(self._resolve, terms) if column is not None]
+        np.add.at(counts, columns, 1.0)
+        return counts
+
+    def fit_transform(self, texts: List[str]) -> np.ndarray:
+        """Build the vocabulary and IDF weights from ``texts`` and embed them."""
+        tokenized = [content_terms(text) for text in texts]
+        for terms in tokenized:
+            for term in terms:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+        counts = np.stack([self._counts(terms) for terms in tokenized]) if texts else \
+            np.zeros((0, 0), dtype=np.float32)
+        document_frequency = (counts > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self._normalise(np.log1p(counts) * self.idf)
+
+    def transform(self, text: str) -> np.ndarray:
+        """Return the normalised embedding of one text."""
+        return self._normalise(np.log1p(self._counts(content_terms(text))) * self.idf)
+
+    @staticmethod
+    def _normalise(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class PassageRetriever:
+    """Top-k cosine retrieval over precomputed passage embeddings."""
+
+    def __init__(self, documents: Iterable[Tuple[str, str, str]]):
+        """Split (doc_id, title, text) documents into passages and embed them."""
+        self.passages = [
+            Passage(doc_id, title, passage)
+            for doc_id, title, text in documents
+            for passage in split_passages(text)
+        ]
+        self.embedder = LexicalEmbedder()
+        self.matrix = self.embedder.fit_transform(
+            [f"{passage.title} {passage.text}" for passage in self.passages])
+
+    def retrieve(self, query: str, k: int = 3, per_doc: int = 1) -> List[RetrievedPassage]:
+        """Return up to ``k`` passages most similar to the query, best first."""
+        if not self.passages:
+            return []
+        scores = self.matrix @ self.embedder.transform(query)
+        results = []
+        taken = {}
+        for position in np.argsort(-scores):
+            score = float(scores[position])
+            if score <= 0:
+                break
+            passage = self.passages[position]
+            if taken.get(passage.doc_id, 0) >= per_doc:
+                continue
+            taken[passage.doc_id] = taken.get(passage.doc_id, 0) + 1
+            results.append(RetrievedPassage(passage, score))
+            if len(results) == k:
+                break
+        return results
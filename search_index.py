@@ -0,0 +1,237 @@
+"""
+CalmSpace - Search Index
+========================
+Prebuilt inverted indexes over the content library.
+
+ResourceIndex answers "is this message asking for a resource topic?" for
+every chat message. Topic keys and titles are split into words once; a
+query is looked up word by word instead of scanning every topic, and
+anything longer than a few content words skips the lookup entirely.
+
+BM25Index powers the 'search' command: every resource, coping strategy,
+breathing exercise and meditation is split into passages and indexed
+once at startup.
+"""
+
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from keyword_matcher import TOKEN_PATTERN, tokenize
+
+# Words that never identify a topic on their own
+STOPWORDS = frozenset("""
+a about am an and any are as at be been but by can could do does doing for
+from get got had has have having he her him his how i i'm i've if in into is
+it it's just me more my no not of on or our out please really she so some
+that the their them then there they this to too up us very want was we what
+when where which who why will with would you your
+""".split())
+
+# Words that make a message about the student ("help me", "I'm having a
+# panic attack") rather than a request for an article
+PERSONAL_WORDS = frozenset("""
+i i'm i've i'd i'll me my myself we we're us our you you're your
+""".split())
+
+# Words in topic names too general to pick a topic unless the query names
+# the whole topic key ("seeking help")
+GENERIC_WORDS = frozenset("""
+awareness basics building dealing healthy help how managing management
+preparation seek seeking signs understanding
+""".split())
+
+
+def content_terms(text: str) -> List[str]:
+    """Tokenize text and drop stopwords."""
+    return [token for token in tokenize(text) if token not in STOPWORDS]
+
+
+def words_of(text: str) -> List[str]:
+    """Lower-cased words of text, unstemmed."""
+    return TOKEN_PATTERN.findall(text.lower().replace("’", "'"))
+
+
+def name_words(text: str) -> List[str]:
+    """Lower-cased words of text without stopwords, unstemmed."""
+    return [word for word in words_of(text) if word not in STOPWORDS]
+
+
+def word_forms(word: str) -> List[str]:
+    """A name word and, for a plural ('attacks'), its singular."""
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 4:
+        return [word, word[:-1]]
+    return [word]
+
+
+class ResourceIndex:
+    """Exact-word index over RESOURCE_LIBRARY topic keys and titles."""
+
+    def __init__(self, titles: Dict[str, str], max_query_terms: int = 4, min_match: float = 1.0):
+        """
+        Build the index from topic keys and their titles.
+
+        ``max_query_terms``: queries with more content words are never
+        treated as topic requests. ``min_match``: fraction of query words
+        that must appear in the best topic's key or title.
+        """
+        self.max_query_terms = max_query_terms
+        self.min_match = min_match
+        self.topics = list(titles)
+
+        self._names: Dict[str, set] = {}
+        self._name_sizes = []
+        self._key_forms: List[List[List[str]]] = []
+        for index, (key, title) in enumerate(titles.items()):
+            words = set(name_words(key)) | set(name_words(title))
+            self._name_sizes.append(len(words))
+            self._key_forms.append([word_forms(word) for word in name_words(key)])
+            for word in words:
+                # A plural topic name ('panic attacks') also matches its singular
+                for form in word_forms(word):
+                    self._names.setdefault(form, set()).add(index)
+
+    def _names_key(self, topic: int, words: List[str]) -> bool:
+        """Whether ``words`` include every word of a topic's key."""
+        return all(any(form in words for form in forms) for forms in self._key_forms[topic])
+
+    def lookup(self, query: str) -> Optional[str]:
+        """
+        Return the topic key a query asks for, or None if it is not a topic request.
+
+        Query words are matched exactly, never stemmed or expanded by
+        prefix, so feelings such as "I'm stressed" or "so depressed" go
+        to the AI rather than to the 'stress management' or 'depression'
+        articles. Messages about the student ("help me", "I'm having a
+        panic attack") are never topic requests, and generic words such as
+        "help" only pick a topic when the query names its whole key. Ties
+        go to the topic with the shortest name.
+        """
+        query = query.strip()
+        if query.isdigit():
+            number = int(query)
+            return self.topics[number - 1] if 1 <= number <= len(self.topics) else None
+
+        words = words_of(query)
+        if PERSONAL_WORDS.intersection(words):
+            return None
+        words = [word for word in words if word not in STOPWORDS]
+        if not words or len(words) > self.max_query_terms:
+            return None
+        hits: Dict[int, int] = {}
+        specific = set()
+        for word in words:
+            for topic in self._names.get(word, ()):
+                hits[topic] = hits.get(topic, 0) + 1
+                if word not in GENERIC_WORDS:
+                    specific.add(topic)
+        hits = {topic: count for topic, count in hits.items()
+                if topic in specific or self._names_key(topic, words)}
+        if not hits:
+            return None
+        best = min(hits, key=lambda topic: (-hits[topic], self._name_sizes[topic], topic))
+        return self.topics[best] if hits[best] / len(words) >= self.min_match else None
+
+
+# ============================================================================
+# FULL-TEXT SEARCH (BM25)
+# ============================================================================
+
+def split_passages(text: str) -> List[str]:
+    """Split content into blank-line separated passages, keeping headings with their body."""
+    passages = []
+    heading = ""
+    for block in text.strip().split("\n\n"):
+        block = block.strip()
+        if not block:
+            continue
+        if "\n" not in block and block.startswith("**") and block.endswith("**") and len(block) < 80:
+            heading = f"{heading}\n{block}" if heading else block
+            continue
+        passages.append(f"{heading}\n{block}" if heading else block)
+        heading = ""
+    if heading:
+        passages.append(heading)
+    return passages
+
+
+class SearchResult(NamedTuple):
+    """A matching passage and the document it belongs to."""
+    doc_id: str
+    title: str
+    passage: str
+    score: float
+
+
+class BM25Index:
+    """
+    In-process BM25 index over content passages.
+
+    Documents are split into passages when added; each passage is scored
+    independently so results point at the most relevant part of a long
+    resource. Call ``build()`` once after adding documents.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, min_prefix: int = 4):
+        self.k1 = k1
+        self.b = b
+        self.min_prefix = min_prefix
+        self._passages: List[Tuple[str, str, str]] = []  # (doc_id, title, text)
+        self._lengths: List[int] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self._passages)
+
+    def add(self, doc_id: str, title: str, text: str):
+        """Add a document, indexing each of its passages."""
+        for passage in split_passages(text):
+            terms = content_terms(f"{title} {passage}")
+            position = len(self._passages)
+            self._passages.append((doc_id, title, passage))
+            self._lengths.append(len(terms))
+            for term in set(terms):
+                self._postings.setdefault(term, []).append((position, terms.count(term)))
+
+    def build(self):
+        """Compute IDF and length statistics after all documents are added."""
+        count = len(self._passages)
+        self._avg_length = sum(self._lengths) / count if count else 0.0
+        self._idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def _resolve(self, term: str) -> Optional[str]:
+        """Map a query term to an indexed term: exact, else its longest indexed prefix."""
+        if term in self._postings:
+            return term
+        for length in range(len(term) - 1, self.min_prefix - 1, -1):
+            if term[:length] in self._postings:
+                return term[:length]
+        return None
+
+    def search(self, query: str, limit: int = 3, per_doc: int = 1) -> List[SearchResult]:
+        """Return the best-scoring passages, at most ``per_doc`` from each document."""
+        scores: Dict[int, float] = {}
+        for term in set(content_terms(query)):
+            indexed = self._resolve(term)
+            if indexed is None:
+                continue
+            idf = self._idf[indexed]
+            for position, frequency in self._postings[indexed]:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / self._avg_length)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        results = []
+        taken: Dict[str, int] = {}
+        for position, score in sorted(scores.items(), key=lambda item: -item[1]):
+            doc_id, title, passage = self._passages[position]
+            if taken.get(doc_id, 0) >= per_doc:
+                continue
+            taken[doc_id] = taken.get(doc_id, 0) + 1
+            results.append(SearchResult(doc_id, title, passage, score))
+            if len(results) == limit:
+                break
+        return results
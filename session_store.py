@@ -0,0 +1,441 @@
+"""
+CalmSpace - Session Store
+=========================
+Bounded in-memory store for per-user session data.
+
+Sessions expire after an idle TTL and the store never holds more than
+``max_entries`` sessions; when full, the least recently used session is
+evicted. Entries are kept in access order, so expiry and eviction only
+ever look at the front of the store.
+"""
+
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from mood_analytics import MoodLog, stack_logs
+
+
+def approx_size(obj, _seen: Optional[set] = None) -> int:
+    """Approximate the deep memory footprint of an object in bytes."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, _seen) + approx_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(approx_size(item, _seen) for item in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(approx_size(getattr(obj, name), _seen)
+                    for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+class SessionStore:
+    """LRU session store with an idle TTL and a maximum entry count."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # session_id -> (last_access, data)
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id) -> bool:
+        return session_id in self._entries
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """Return a session and mark it as recently used, or None."""
+        now = self._clock()
+        self._expire(now)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        self._entries[session_id] = (now, entry[1])
+        self._entries.move_to_end(session_id)
+        return entry[1]
+
+    def get_or_create(self, session_id: str, factory: Callable[[], dict]) -> dict:
+        """Return a session, creating it with ``factory`` if it is missing."""
+        data = self.get(session_id)
+        if data is None:
+            data = factory()
+            self.put(session_id, data)
+        return data
+
+    def put(self, session_id: str, data: dict):
+        """Store a session, evicting the least recently used ones if full."""
+        now = self._clock()
+        self._expire(now)
+        self._entries[session_id] = (now, data)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def values(self) -> List[dict]:
+        """
+        Return every live session without changing their access order or
+        expiring any, so it can be called from a worker thread.
+        """
+        cutoff = self._clock() - self.ttl_seconds
+        return [data for last_access, data in list(self._entries.values()) if last_access > cutoff]
+
+    def pop(self, session_id: str) -> Optional[dict]:
+        """Remove a session and return it, or None if it is not stored."""
+        entry = self._entries.pop(session_id, None)
+        return entry[1] if entry else None
+
+    def _expire(self, now: float):
+        """Drop sessions idle for longer than the TTL."""
+        cutoff = now - self.ttl_seconds
+        while self._entries:
+            session_id, (last_access, _) = next(iter(self._entries.items()))
+            if last_access > cutoff:
+                break
+            del self._entries[session_id]
+            self.expirations += 1
+
+    def stats(self) -> dict:
+        """Return entry, eviction and approximate memory counters."""
+        self._expire(self._clock())
+        return {
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "approx_bytes": self.approx_bytes(),
+        }
+
+    def approx_bytes(self, sample_size: int = 32) -> int:
+        """
+        Estimate the sessions' memory footprint from at most ``sample_size``
+        evenly spaced sessions, so a stats call costs the same at any store size.
+        """
+        entries = list(self._entries.values())
+        if not entries:
+            return 0
+        sample = entries[::max(1, len(entries) // sample_size)][:sample_size]
+        return round(sum(approx_size(data) for _, data in sample) * len(entries) / len(sample))
+
+
+# ============================================================================
+# STORAGE BACKENDS
+# ============================================================================
+
+class ConversationTurn:
+    """One conversation message; ``timestamp`` is seconds since the epoch."""
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: str, content: str, timestamp: float):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+
+    def __repr__(self) -> str:
+        return f"ConversationTurn({self.role!r}, {self.content[:30]!r}, {self.timestamp})"
+
+
+def to_timestamp(value) -> float:
+    """Convert a stored timestamp (number, numeric text or ISO string) to epoch seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def new_session(history_capacity: int = 20) -> dict:
+    """Return empty session data for a new user."""
+    return {
+        "mood_history": MoodLog(),
+        "conversation_history": deque(maxlen=history_capacity),
+        "challenge_day": 1,
+        "challenge_started": None,
+        "turn_count": 0,
+        "summary": "",
+        "summarized_turns": 0
+    }
+
+
+class SessionBackend:
+    """
+    Storage interface for session data shared by the chat handlers.
+
+    ``conversation_history`` is a ring buffer of the last ``history_capacity``
+    ConversationTurn records, oldest first; ``mood_history`` is a MoodLog.
+    """
+
+    history_capacity = 20
+
+    def load(self, session_id: str) -> dict:
+        """Return the session data, creating an empty session if needed."""
+        raise NotImplementedError
+
+    def save(self, session_id: str, data: dict):
+        """Persist the scalar fields (challenge progress) of a session."""
+        raise NotImplementedError
+
+    def append_conversation(self, session_id: str, turn: ConversationTurn):
+        """Append a conversation turn, dropping the oldest beyond capacity."""
+        raise NotImplementedError
+
+    def save_summary(self, session_id: str, summary: str, summarized_turns: int):
+        """Store the rolling summary covering the first ``summarized_turns`` turns."""
+        raise NotImplementedError
+
+    def append_mood(self, session_id: str, entry: dict):
+        """Append a mood log entry (``mood``, ``intensity`` and epoch ``timestamp``)."""
+        raise NotImplementedError
+
+    def mood_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return (session index, timestamps, intensities) of every stored mood,
+        grouped by session. Safe to call from a worker thread.
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """Return backend counters."""
+        return {}
+
+
+class MemorySessionBackend(SessionBackend):
+    """Per-process backend on top of a bounded SessionStore."""
+
+    def __init__(self, store: SessionStore, history_capacity: int = 20):
+        self.store = store
+        self.history_capacity = history_capacity
+
+    def load(self, session_id: str) -> dict:
+        return self.store.get_or_create(session_id, lambda: new_session(self.history_capacity))
+
+    def save(self, session_id: str, data: dict):
+        self.store.put(session_id, data)
+
+    def append_conversation(self, session_id: str, turn: ConversationTurn):
+        session = self.load(session_id)
+        session["conversation_history"].append(turn)
+        session["turn_count"] += 1
+
+    def save_summary(self, session_id: str, summary: str, summarized_turns: int):
+        session = self.load(session_id)
+        session["summary"] = summary
+        session["summarized_turns"] = summarized_turns
+
+    def append_mood(self, session_id: str, entry: dict):
+        self.load(session_id)["mood_history"].append(entry["intensity"], entry["timestamp"])
+
+    def mood_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return stack_logs(data["mood_history"] for data in self.store.values())
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Embedded backend that several local worker processes can share.
+
+    The database runs in WAL mode so readers never block the writer, and
+    a busy timeout lets concurrent writers from other processes wait for
+    the lock instead of failing. Loading a session only reads: it never
+    takes the write lock, so the several loads per message cannot stall
+    the event loop behind other workers. A session's row is created and
+    its last-seen time refreshed by the writes that follow.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        challenge_day INTEGER NOT NULL DEFAULT 1,
+        challenge_started TEXT,
+        turn_count INTEGER NOT NULL DEFAULT 0,
+        summary TEXT NOT NULL DEFAULT '',
+        summarized_turns INTEGER NOT NULL DEFAULT 0,
+        last_seen REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS conversation (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        timestamp REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS conversation_session ON conversation (session_id, id);
+    CREATE TABLE IF NOT EXISTS moods (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        mood TEXT NOT NULL,
+        intensity INTEGER NOT NULL,
+        timestamp TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS moods_session ON moods (session_id, id);
+    """
+
+    ADDED_COLUMNS = [
+        ("turn_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("summary", "TEXT NOT NULL DEFAULT ''"),
+        ("summarized_turns", "INTEGER NOT NULL DEFAULT 0"),
+    ]
+
+    def __init__(self, path: str, ttl_seconds: float = 3600, busy_timeout: float = 5.0,
+                 history_capacity: int = 20):
+        self.path = path
+        self.history_capacity = history_capacity
+        self.ttl_seconds = ttl_seconds
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout,
+                                     isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add session columns introduced after a database was created."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        for name, definition in self.ADDED_COLUMNS:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE sessions ADD COLUMN {name} {definition}")
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in one write transaction, serialised across processes."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            yield
+
+    @contextmanager
+    def _snapshot(self):
+        """Run reads against one consistent snapshot, without the write lock."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            yield
+
+    def _touch(self, session_id: str):
+        """Create the session row if needed and refresh its last-seen time."""
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE sessions SET last_seen = ? WHERE session_id = ?", (now, session_id))
+        if cursor.rowcount == 0:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, last_seen) VALUES (?, ?)",
+                (session_id, now))
+            self._purge_expired(now)
+
+    def _purge_expired(self, now: float):
+        """Delete sessions idle for longer than the TTL, with their history."""
+        cutoff = now - self.ttl_seconds
+        stale = "SELECT session_id FROM sessions WHERE last_seen < ?"
+        self._conn.execute(f"DELETE FROM conversation WHERE session_id IN ({stale})", (cutoff,))
+        self._conn.execute(f"DELETE FROM moods WHERE session_id IN ({stale})", (cutoff,))
+        self._conn.execute("DELETE FROM sessions WHERE last_seen < ?", (cutoff,))
+
+    def load(self, session_id: str) -> dict:
+        with self._snapshot():
+            row = self._conn.execute(
+                "SELECT challenge_day, challenge_started, turn_count, summary, summarized_turns "
+                "FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return new_session(self.history_capacity)
+            challenge_day, challenge_started, turn_count, summary, summarized_turns = row
+            conversation = self._conn.execute(
+                "SELECT role, content, timestamp FROM conversation "
+                "WHERE session_id = ? ORDER BY id", (session_id,)).fetchall()
+            moods = self._conn.execute(
+                "SELECT mood, intensity, timestamp FROM moods "
+                "WHERE session_id = ? ORDER BY id", (session_id,)).fetchall()
+        return {
+            "mood_history": MoodLog.from_entries(
+                (intensity for _, intensity, _ in moods),
+                (to_timestamp(timestamp) for _, _, timestamp in moods)
+            ),
+            "conversation_history": deque(
+                (ConversationTurn(role, content, to_timestamp(timestamp))
+                 for role, content, timestamp in conversation),
+                maxlen=self.history_capacity
+            ),
+            "challenge_day": challenge_day,
+            "challenge_started": challenge_started,
+            "turn_count": turn_count,
+            "summary": summary,
+            "summarized_turns": summarized_turns
+        }
+
+    def save(self, session_id: str, data: dict):
+        with self._transaction():
+            self._touch(session_id)
+            self._conn.execute(
+                "UPDATE sessions SET challenge_day = ?, challenge_started = ? WHERE session_id = ?",
+                (data["challenge_day"], data["challenge_started"], session_id))
+
+    def append_conversation(self, session_id: str, turn: ConversationTurn):
+        with self._transaction():
+            self._touch(session_id)
+            self._conn.execute(
+                "INSERT INTO conversation (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                (session_id, turn.role, turn.content, turn.timestamp))
+            self._conn.execute(
+                "DELETE FROM conversation WHERE session_id = ? AND id NOT IN "
+                "(SELECT id FROM conversation WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.history_capacity))
+            self._conn.execute(
+                "UPDATE sessions SET turn_count = turn_count + 1 WHERE session_id = ?", (session_id,))
+
+    def save_summary(self, session_id: str, summary: str, summarized_turns: int):
+        with self._transaction():
+            self._touch(session_id)
+            self._conn.execute(
+                "UPDATE sessions SET summary = ?, summarized_turns = ? WHERE session_id = ?",
+                (summary, summarized_turns, session_id))
+
+    def append_mood(self, session_id: str, entry: dict):
+        with self._transaction():
+            self._touch(session_id)
+            self._conn.execute(
+                "INSERT INTO moods (session_id, mood, intensity, timestamp) VALUES (?, ?, ?, ?)",
+                (session_id, entry["mood"], entry["intensity"], entry["timestamp"]))
+
+    def mood_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        query = "SELECT session_id, intensity, timestamp FROM moods ORDER BY session_id, id"
+        if self.path == ":memory:":
+            with self._lock:
+                rows = self._conn.execute(query).fetchall()
+        else:
+            # A connection of its own, so a long scan in a worker thread does
+            # not hold the lock that session loads and saves wait on
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            try:
+                rows = conn.execute(query).fetchall()
+            finally:
+                conn.close()
+        if not rows:
+            return stack_logs([])
+        _, sessions = np.unique([session_id for session_id, _, _ in rows], return_inverse=True)
+        return (sessions.astype(np.int64),
+                np.fromiter((to_timestamp(timestamp) for _, _, timestamp in rows),
+                            dtype=np.float64, count=len(rows)),
+                np.fromiter((intensity for _, intensity, _ in rows), dtype=np.int8, count=len(rows)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        return {"entries": entries}
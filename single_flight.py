@@ -0,0 +1,115 @@
+"""
+CalmSpace - Single Flight
+=========================
+Coalescing of identical concurrent AI requests into one upstream call.
+
+When a class gets the same bad news, many students open with the same
+message within seconds. The first request for a prompt leads: it calls
+the model and publishes the reply, chunk by chunk when streaming. Every
+identical request arriving while it is in flight follows it and receives
+the same chunks instead of starting a completion of its own. Flights are
+keyed like the response cache, by the full effective prompt, and are
+forgotten as soon as the leader finishes. If the leader is cancelled (its
+student stopped the reply or left), followers get FlightAbandoned and
+join again: the first to do so leads a fresh request for the rest.
+"""
+
+import asyncio
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+
+class FlightAbandoned(Exception):
+    """Raised to followers when the leading request was cancelled; they should join again."""
+
+
+class Flight:
+    """One reply in progress, readable by any number of followers."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.followers = 0
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        """Append a piece of the reply and wake the followers."""
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[Exception] = None):
+        """Mark the reply complete, or failed with ``error``; later calls are ignored."""
+        if self.done:
+            return
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def stream(self) -> AsyncIterator[str]:
+        """Yield the chunks so far, then each new one; raise the leader's error if it failed."""
+        position = 0
+        while True:
+            while position < len(self.chunks):
+                position += 1
+                yield self.chunks[position - 1]
+            if self.done:
+                break
+            await self._changed.wait()
+        if self.error is not None:
+            raise self.error
+
+    async def result(self) -> str:
+        """Wait for the whole reply."""
+        return "".join([chunk async for chunk in self.stream()])
+
+
+class SingleFlight:
+    """In-flight replies by prompt key."""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(self, key: Optional[str]) -> Optional[Flight]:
+        """Return the flight already answering ``key`` (counting a follower), or None."""
+        flight = self._flights.get(key) if key else None
+        if flight is not None:
+            flight.followers += 1
+            self.followers += 1
+        return flight
+
+    @contextmanager
+    def lead(self, key: Optional[str]):
+        """
+        Yield a new flight that identical requests can join until the block
+        exits, when it is finished (with the block's error, if any) and
+        forgotten. With no key the flight is private.
+        """
+        flight = Flight()
+        if key:
+            self._flights[key] = flight
+            self.leaders += 1
+        try:
+            yield flight
+        except Exception as e:
+            flight.finish(e)
+            raise
+        except BaseException:
+            flight.finish(FlightAbandoned("The leading request was cancelled"))
+            raise
+        finally:
+            flight.finish()
+            if key and self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "followers": self.followers}
@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from content_loader import LazyCatalog
+
+
+def write(path, data, mtime):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def library(tmp_path):
+    write(tmp_path / "manifest.json", {"items": [
+        {"key": "grief", "file": "grief.json", "label": "Grief & Loss"},
+        {"key": "sleep", "file": "sleep.json", "label": "Sleep Hygiene"},
+    ]}, 1000)
+    write(tmp_path / "grief.json", {"title": "Grief", "content": "old"}, 1000)
+    write(tmp_path / "sleep.json", {"title": "Sleep", "content": "old"}, 1000)
+    return tmp_path
+
+
+def test_read_does_not_keep_items_loaded(library):
+    catalog = LazyCatalog(str(library))
+    assert catalog.read("grief")["content"] == "old"
+    assert catalog.loaded() == 0
+
+
+def test_edit_to_an_item_only_read_is_reported(library):
+    catalog = LazyCatalog(str(library))
+    catalog.read("grief")
+    assert not catalog.refresh()
+
+    write(library / "grief.json", {"title": "Grief", "content": "new"}, 2000)
+    assert catalog.refresh()
+    assert not catalog.refresh()
+    assert catalog.read("grief")["content"] == "new"
+
+
+def test_edit_to_a_loaded_item_drops_it(library):
+    catalog = LazyCatalog(str(library))
+    assert catalog["sleep"]["content"] == "old"
+
+    write(library / "sleep.json", {"title": "Sleep", "content": "new"}, 2000)
+    assert catalog.refresh()
+    assert catalog.loaded() == 0
+    assert catalog["sleep"]["content"] == "new"
+
+
+def test_untouched_items_are_not_checked(library):
+    catalog = LazyCatalog(str(library))
+    catalog.read("grief")
+    write(library / "sleep.json", {"title": "Sleep", "content": "new"}, 2000)
+    assert not catalog.refresh()
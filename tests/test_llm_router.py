@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from llm_router import LLMRouter, ModelEndpoint
+from resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+def endpoint(name, **kwargs):
+    return ModelEndpoint(name, f"{name}-model", client=None, **kwargs)
+
+
+async def hang(endpoint):
+    await asyncio.Event().wait()
+
+
+def answer_from(*names):
+    async def make_request(endpoint):
+        if endpoint.name not in names:
+            await asyncio.Event().wait()
+        return endpoint.name
+    return make_request
+
+
+def test_hung_endpoint_times_out_and_fails_over():
+    primary, backup = endpoint("primary"), endpoint("backup")
+    router = LLMRouter([primary, backup], hedge=False, attempt_timeout=0.05)
+
+    answered, result = asyncio.run(router.call(answer_from("backup")))
+
+    assert (answered, result) == (backup, "backup")
+    assert primary.requests == primary.errors == 1
+    assert primary.error_rate > 0
+    assert backup.samples("chat") == 1
+
+
+def test_repeated_timeouts_open_the_endpoint_circuit():
+    primary = endpoint("primary", breaker=CircuitBreaker(failure_threshold=3))
+    backup = endpoint("backup")
+    router = LLMRouter([primary, backup], hedge=False, attempt_timeout=0.02)
+
+    async def scenario():
+        for _ in range(3):
+            await router.call(answer_from("backup"))
+
+    asyncio.run(scenario())
+    assert primary.breaker.state == CircuitBreaker.OPEN
+    assert router.ranked("chat")[0] is backup
+
+
+def test_endpoint_timeout_overrides_router_timeout():
+    primary = endpoint("primary", timeout=0.02)
+    router = LLMRouter([primary], hedge=False, attempt_timeout=60)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(router.call(hang))
+    assert primary.errors == 1
+
+
+def test_cancelled_half_open_trial_is_released(clock):
+    primary = endpoint("primary", breaker=CircuitBreaker(failure_threshold=1, reset_seconds=30, clock=clock))
+    primary.breaker.record_failure()
+    clock.now += 30
+    router = LLMRouter([primary], hedge=False)
+
+    async def scenario():
+        task = asyncio.ensure_future(router.call(hang))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await router.call(answer_from("primary"))
+
+    assert asyncio.run(scenario()) == (primary, "primary")
+    assert primary.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_losing_hedge_releases_its_half_open_trial(clock):
+    primary = endpoint("primary")
+    backup = endpoint("backup", breaker=CircuitBreaker(failure_threshold=1, reset_seconds=30, clock=clock))
+    backup.breaker.record_failure()
+    clock.now += 30
+    for _ in range(20):
+        primary.record(0.01, "chat")
+    router = LLMRouter([primary, backup], hedge_min_samples=20)
+
+    async def slow_primary(endpoint):
+        if endpoint is primary:
+            await asyncio.sleep(0.05)
+            return "primary"
+        await asyncio.Event().wait()
+
+    answered, _ = asyncio.run(router.call(slow_primary))
+    assert answered is primary
+    assert backup.hedges == 1
+    assert backup.breaker.state == CircuitBreaker.HALF_OPEN
+    assert backup.breaker.allow()
+
+
+def test_latency_windows_are_kept_per_kind():
+    primary = endpoint("primary", max_p95_seconds=1.0)
+    for _ in range(50):
+        primary.record(5.0, "summary")
+        primary.record(0.2, "stream")
+
+    assert primary.percentile(0.95, "stream") == 0.2
+    assert primary.percentile(0.95, "summary") == 5.0
+    assert primary.percentile(0.95, "chat") is None
+    assert primary.healthy("stream")
+    assert not primary.healthy("summary")
+
+
+def test_router_circuit_open_is_not_counted_as_upstream_success(clock):
+    primary = endpoint("primary", breaker=CircuitBreaker(failure_threshold=1, reset_seconds=60, clock=clock))
+    primary.breaker.record_failure()
+    router = LLMRouter([primary], hedge=False)
+    chain_breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30, clock=clock)
+    chain_breaker.record_failure()
+    clock.now += 30  # chain breaker half-open, endpoint still open
+    caller = ResilientCaller(breaker=chain_breaker, clock=clock)
+
+    async def ok(endpoint):
+        return "ok"
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(caller.call(lambda: router.call(ok)))
+    assert chain_breaker.state == CircuitBreaker.HALF_OPEN
+    assert chain_breaker.allow()
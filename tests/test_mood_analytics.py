@@ -0,0 +1,47 @@
+import numpy as np
+
+from mood_analytics import MoodLog, aggregate, stack_logs
+from session_store import SessionStore
+
+
+def test_stack_logs_groups_rows_by_session():
+    first = MoodLog.from_entries([3, 4], [10.0, 20.0])
+    second = MoodLog.from_entries([1], [30.0])
+
+    sessions, timestamps, intensities = stack_logs([first, MoodLog(), second])
+
+    assert sessions.tolist() == [0, 0, 1]
+    assert timestamps.tolist() == [10.0, 20.0, 30.0]
+    assert intensities.tolist() == [3, 4, 1]
+
+
+def test_snapshot_is_not_changed_by_later_appends():
+    log = MoodLog(capacity=2)
+    log.append(2, 10.0)
+    timestamps, intensities = log.snapshot()
+    for step in range(10):
+        log.append(5, 20.0 + step)
+
+    assert timestamps.tolist() == [10.0]
+    assert intensities.tolist() == [2]
+
+
+def test_aggregate_flags_declining_sessions():
+    logs = [MoodLog.from_entries([5, 5, 5, 2, 2, 2], np.arange(6.0)),
+            MoodLog.from_entries([3, 3, 3, 3, 3, 3], np.arange(6.0))]
+
+    report = aggregate(*stack_logs(logs), window=3, decline_drop=1.0, utc_offset=0)
+
+    assert report["sessions"] == 2
+    assert report["declining_sessions"] == 1
+
+
+def test_store_values_skip_idle_sessions_without_expiring_them(clock):
+    store = SessionStore(ttl_seconds=60, clock=clock)
+    store.put("idle", {"name": "idle"})
+    clock.now += 50
+    store.put("active", {"name": "active"})
+    clock.now += 20
+
+    assert store.values() == [{"name": "active"}]
+    assert len(store) == 2 and store.expirations == 0
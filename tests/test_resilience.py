@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+def open_breaker(clock, threshold=3, reset_seconds=30):
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_seconds=reset_seconds, clock=clock)
+    for _ in range(threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, clock=clock)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()  # resets the count
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.opened == 1
+    assert breaker.rejected == 1
+
+
+def test_half_open_allows_a_single_trial(clock):
+    breaker = open_breaker(clock)
+    clock.now += 29.9
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 0.1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_trial_closes(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_released_trial_can_be_retried(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_cancelled_trial_does_not_wedge_the_breaker(clock):
+    breaker = open_breaker(clock)
+    caller = ResilientCaller(breaker=breaker, clock=clock, rng=lambda low, high: 0.0)
+    clock.now += 30
+
+    async def hang():
+        await asyncio.Event().wait()
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        task = asyncio.ensure_future(caller.call(hang))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert await caller.call(ok) == "ok"
+
+    asyncio.run(scenario())
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retries_transient_errors_then_succeeds(clock):
+    caller = ResilientCaller(max_attempts=3, clock=clock, rng=lambda low, high: 0.0)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise TimeoutError("slow upstream")
+        return "ok"
+
+    assert asyncio.run(caller.call(flaky)) == "ok"
+    assert caller.retries == 2
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_permanent_errors_are_not_retried(clock):
+    caller = ResilientCaller(max_attempts=3, clock=clock, rng=lambda low, high: 0.0)
+    attempts = []
+
+    async def bad_request():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(caller.call(bad_request))
+    assert len(attempts) == 1
+    assert caller.failures == 1
+
+
+def test_open_breaker_fails_fast(clock):
+    caller = ResilientCaller(breaker=open_breaker(clock), clock=clock)
+
+    async def never_called():
+        raise AssertionError("called upstream while open")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(caller.call(never_called))
+
+
+def test_expired_deadline_raises_timeout(clock):
+    caller = ResilientCaller(clock=clock)
+
+    async def ok():
+        return "ok"
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(caller.call(ok, deadline=clock.now - 1))
+    assert caller.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,46 @@
+import pytest
+
+from content_loader import catalog
+from search_index import ResourceIndex
+
+LIBRARY = catalog("resource_library")
+
+
+@pytest.fixture(scope="module")
+def index():
+    return ResourceIndex({key: LIBRARY[key]["title"] for key in LIBRARY})
+
+
+@pytest.mark.parametrize("message", [
+    "I'm stressed", "so stressed", "stressed out", "I'm depressed", "I'm homesick",
+    "feeling anxious", "I'm so lonely", "I can't sleep at night", "panicking",
+    "help me", "can you help me", "please help", "help me please", "help",
+    "I'm having a panic attack", "I need help with my anxiety",
+])
+def test_feelings_fall_through_to_the_ai(index, message):
+    assert index.lookup(message) is None
+
+
+@pytest.mark.parametrize("query, topic", [
+    ("anxiety", "anxiety"),
+    ("stress", "stress management"),
+    ("exam anxiety", "exam anxiety"),
+    ("Social Anxiety", "social anxiety"),
+    ("panic attack", "panic attacks"),
+    ("homesickness", "homesickness"),
+    ("burnout", "burnout"),
+    ("self-compassion", "self compassion"),
+    ("seeking help", "seeking help"),
+    ("time management", "time management"),
+    ("1", "stress management"),
+    ("20", "seeking help"),
+])
+def test_topic_requests(index, query, topic):
+    assert index.lookup(query) == topic
+
+
+def test_out_of_range_number_and_stopwords(index):
+    assert index.lookup("21") is None
+    assert index.lookup("0") is None
+    assert index.lookup("me") is None
+    assert index.lookup("") is None
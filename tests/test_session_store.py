@@ -0,0 +1,16 @@
+from session_store import SessionStore, approx_size
+
+
+def test_approx_bytes_is_exact_for_small_stores():
+    store = SessionStore()
+    for index in range(10):
+        store.put(f"s{index}", {"summary": "x" * index})
+    assert store.approx_bytes() == sum(approx_size({"summary": "x" * index}) for index in range(10))
+
+
+def test_approx_bytes_samples_large_stores():
+    store = SessionStore()
+    for index in range(1000):
+        store.put(f"s{index}", {"summary": "x" * 100})
+    assert store.approx_bytes(sample_size=10) == 1000 * approx_size({"summary": "x" * 100})
+    assert store.stats()["approx_bytes"] == store.approx_bytes()
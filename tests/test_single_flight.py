@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from single_flight import FlightAbandoned, SingleFlight
+
+
+def test_followers_receive_the_leaders_chunks():
+    flights = SingleFlight()
+
+    async def scenario():
+        with flights.lead("key") as flight:
+            follower = flights.join("key")
+            reading = asyncio.ensure_future(follower.result())
+            for chunk in ("Hello", ", ", "there"):
+                flight.publish(chunk)
+                await asyncio.sleep(0)
+        return await reading
+
+    assert asyncio.run(scenario()) == "Hello, there"
+    assert len(flights) == 0
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "followers": 1}
+
+
+def test_leader_error_reaches_followers():
+    flights = SingleFlight()
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            with flights.lead("key"):
+                follower = flights.join("key")
+                raise ValueError("bad request")
+        with pytest.raises(ValueError):
+            await follower.result()
+
+    asyncio.run(scenario())
+
+
+def test_requests_without_a_key_are_never_joined():
+    flights = SingleFlight()
+    with flights.lead(None):
+        assert flights.join(None) is None
+    assert flights.leaders == 0
+
+
+def test_cancelled_leader_hands_off_to_a_follower():
+    flights = SingleFlight()
+    upstream_calls = []
+
+    async def reply(key):
+        flight = flights.join(key)
+        while flight is not None:
+            try:
+                return await flight.result()
+            except FlightAbandoned:
+                flight = flights.join(key)
+        with flights.lead(key) as flight:
+            upstream_calls.append(key)
+            flight.publish("partial ")
+            await asyncio.sleep(0.05)
+            flight.publish("reply")
+            return "partial reply"
+
+    async def scenario():
+        leader = asyncio.ensure_future(reply("key"))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.ensure_future(reply("key")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(scenario()) == ["partial reply"] * 3
+    assert len(upstream_calls) == 2  # the cancelled leader's, then one more for all followers
+    assert len(flights) == 0